@@ -1,4 +1,6 @@
-from rides import app
+from rides import create_app
+
+app = create_app()
 
 if __name__ == '__main__':
     app.run(host=app.config['IP'], port=int(app.config['PORT']))
@@ -0,0 +1,118 @@
+"""
+Check that the admin export streams: peak memory should stay flat as the
+tables grow.
+
+For each --sizes N, fills a scratch database with N past events (half of
+them archived), each with --cars cars of --riders riders, then downloads
+/admin/export.csv or .ndjson through the test client without buffering it and
+reports rows, throughput and the peak memory allocated while streaming.
+
+    python benchmarks/export.py --sizes 1000 5000 20000 --format ndjson
+
+Runs against a throwaway SQLite file unless --url points somewhere else (use
+Postgres to exercise server-side cursors). Exits non-zero if the row count
+is wrong.
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(url):
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import rides  # pylint: disable=import-outside-toplevel
+    app = rides.create_app({'SQLALCHEMY_DATABASE_URI': url, 'WTF_CSRF_ENABLED': False, 'ADMINS': 'admin'})
+    return app, rides.db
+
+
+def seed(db, models, events, cars, riders):
+    """Add `events` past events with their cars and riders in bulk. Returns the rows the export should have."""
+    start = datetime.datetime(2000, 1, 1)
+    # Ids carry on from both the live and the archive tables.
+    first = max(db.session.query(db.func.max(model.id)).scalar() or 0
+                for model in (models.Event, models.ArchivedEvent)) + 1
+    car_id = max(db.session.query(db.func.max(model.id)).scalar() or 0
+                 for model in (models.Car, models.ArchivedCar)) + 1
+    event_rows, car_rows, rider_rows = [], [], []
+    for event_id in range(first, first + events):
+        when = start + datetime.timedelta(hours=event_id)
+        event_rows.append({'id': event_id, 'name': f'Event {event_id}', 'address': 'Somewhere', 'start_time': when,
+                           'end_time': when, 'creator': 'host',
+                           # Every other event is flagged expired, to be archived.
+                           'expired': event_id % 2 == 0, 'expires_at': when, 'version': 0})
+        for n in range(cars):
+            car_rows.append({'id': car_id, 'username': f'driver{n}', 'name': f'Driver {n}', 'current_capacity': riders,
+                             'max_capacity': riders, 'departure_time': when, 'return_time': when,
+                             'driver_comment': '', 'event_id': event_id})
+            rider_rows += [{'username': f'rider{n}.{r}', 'name': f'Rider {r}', 'car_id': car_id, 'event_id': event_id}
+                           for r in range(riders)]
+            car_id += 1
+    db.session.execute(models.Event.__table__.insert(), event_rows)
+    db.session.execute(models.Car.__table__.insert(), car_rows)
+    if rider_rows:
+        db.session.execute(models.Rider.__table__.insert(), rider_rows)
+    db.session.commit()
+    return events * cars * max(riders, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='SQLAlchemy URL of an empty scratch database (default: temporary SQLite file)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000], help='events in the tables')
+    parser.add_argument('--cars', type=int, default=3, help='cars per event')
+    parser.add_argument('--riders', type=int, default=3, help='riders per car')
+    parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as scratch:
+        app, db = load_app(args.url or f"sqlite:///{os.path.join(scratch, 'export.db')}")
+        from rides import models  # pylint: disable=import-outside-toplevel
+        with app.app_context():
+            db.create_all()
+            db.session.add(models.User('admin', 'Admin', 'User', ''))
+            db.session.commit()
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = 'admin'
+            session['_fresh'] = True
+        print(f"{'events':>8}{'rows':>10}{'MB':>8}{'seconds':>9}{'rows/s':>10}{'peak KB':>9}")
+        expected = seeded = 0
+        try:
+            for size in args.sizes:
+                with app.app_context():
+                    expected += seed(db, models, size - seeded, args.cars, args.riders)
+                    seeded = size
+                    models.ArchivedEvent.archive(500)
+                tracemalloc.start()
+                began = time.perf_counter()
+                response = client.get(f'/admin/export.{args.format}', buffered=False)
+                lines = size_bytes = 0
+                for chunk in response.response:
+                    lines += chunk.count(b'\n')
+                    size_bytes += len(chunk)
+                response.close()
+                elapsed = time.perf_counter() - began
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                rows = lines - (1 if args.format == 'csv' else 0)
+                print(f'{size:>8}{rows:>10}{size_bytes / 1e6:>8.1f}{elapsed:>9.2f}{rows / elapsed:>10.0f}'
+                      f'{peak / 1024:>9.0f}')
+                if rows != expected:
+                    print(f'expected {expected} rows')
+                    failures += 1
+        finally:
+            with app.app_context():
+                db.drop_all()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
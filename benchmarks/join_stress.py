@@ -0,0 +1,118 @@
+"""
+Hammer Rider.join from many threads at once and check that no car is
+overbooked and nobody rides twice in the same event. Reports join
+throughput.
+
+    python benchmarks/join_stress.py --threads 64 --cars 5 --seats 4
+
+Runs against a throwaway SQLite file unless --url points somewhere else;
+the target database is created from the models and dropped afterwards.
+Exits non-zero if any invariant is violated.
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(url):
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import rides  # pylint: disable=import-outside-toplevel
+    return rides.create_app({'SQLALCHEMY_DATABASE_URI': url}), rides.db
+
+
+def seed_event(db, models, cars, seats):
+    now = datetime.datetime.now()
+    event = models.Event('stress', 'nowhere', now, now + datetime.timedelta(hours=1), 'driver0')
+    db.session.add(event)
+    db.session.flush()
+    for i in range(cars):
+        db.session.add(models.Car(f'driver{i}', f'Driver {i}', 0, seats, now, now, '', event.id))
+    db.session.commit()
+    return event.id, [car.id for car in event.cars]
+
+
+def stampede(app, models, car_ids, threads):
+    """Start every user's joins at the same instant. Returns (seats taken, seconds)."""
+    results = []
+    start = threading.Barrier(threads)
+
+    def rider(n):
+        # Every user goes for two cars at once, so both the seat and the per-event check are contested.
+        with app.app_context():
+            start.wait()
+            for car_id in (car_ids[n % len(car_ids)], car_ids[(n + 1) % len(car_ids)]):
+                results.append(models.Rider.join(models.Car.query.get(car_id), f'user{n}', f'User {n}'))
+            models.db.session.remove()
+
+    workers = [threading.Thread(target=rider, args=(n,)) for n in range(threads)]
+    began = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(results), time.perf_counter() - began
+
+
+def check(models, event_id, expected):
+    """Print and count violations of the seat and one-ride-per-event invariants."""
+    failures = 0
+    for car in models.Car.query.filter(models.Car.event_id == event_id):
+        riders = models.Rider.query.filter(models.Rider.car_id == car.id).count()
+        if riders > car.max_capacity or riders != car.current_capacity:
+            print(f'car {car.id}: {riders} riders, capacity {car.current_capacity}/{car.max_capacity}')
+            failures += 1
+    usernames = [r.username for r in models.Rider.query.filter(models.Rider.event_id == event_id)]
+    if len(usernames) != len(set(usernames)):
+        print(f'event {event_id}: a user rides more than once')
+        failures += 1
+    if len(usernames) != expected:
+        print(f'event {event_id}: {len(usernames)} riders, expected {expected}')
+        failures += 1
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='SQLAlchemy URL of an empty scratch database (default: temporary SQLite file)')
+    parser.add_argument('--threads', type=int, default=64, help='concurrent users, one thread each')
+    parser.add_argument('--cars', type=int, default=5, help='cars in the event')
+    parser.add_argument('--seats', type=int, default=4, help='seats per car')
+    parser.add_argument('--rounds', type=int, default=5, help='times to repeat the stampede')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        app, db = load_app(args.url or f"sqlite:///{os.path.join(scratch, 'stress.db')}?timeout=30")
+        from rides import models  # pylint: disable=import-outside-toplevel
+
+        failures = joined = elapsed = 0
+        with app.app_context():
+            db.create_all()
+        try:
+            for _ in range(args.rounds):
+                with app.app_context():
+                    event_id, car_ids = seed_event(db, models, args.cars, args.seats)
+                seats, seconds = stampede(app, models, car_ids, args.threads)
+                joined += seats
+                elapsed += seconds
+                with app.app_context():
+                    failures += check(models, event_id, min(args.threads, args.cars * args.seats))
+        finally:
+            with app.app_context():
+                db.drop_all()
+
+    attempts = args.rounds * args.threads * 2
+    print(f'{attempts} join attempts, {joined} seats taken in {elapsed:.3f}s '
+          f'({attempts / elapsed:.0f} attempts/s, {joined / elapsed:.0f} joins/s)')
+    print('no overbooking' if not failures else f'{failures} invariant violation(s)')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
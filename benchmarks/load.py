@@ -0,0 +1,186 @@
+"""
+Load test the app under gunicorn with each worker model.
+
+Seeds a scratch database with a synthetic board (the same one as
+benchmarks/routes.py), then for each --worker-classes starts gunicorn with
+gunicorn.conf.py and --workers workers, and hits --paths from --concurrency
+client threads over keep-alive connections for --seconds. Reports requests
+per second, latency percentiles and errors per worker model.
+
+    python benchmarks/load.py --worker-classes sync gthread gevent --workers 2 --concurrency 16
+
+No SSO provider is involved: clients send the session cookie a login would
+have set (signed data or a server-side session id, depending on
+SESSION_BACKEND). --streams keeps that many live update streams open during
+the run, the way browsers on the board do; under sync workers each one holds
+a worker. gevent must be installed for its run.
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from routes import ROOT, load_app, seed
+
+SECRET_KEY = 'load-test'
+# Requests go to 127.0.0.1 with this name in the Host header, as the app only answers to SERVER_NAME.
+HOST = 'rideboard.test'
+
+
+def session_cookie(app, username):
+    """A session cookie logging `username` in, as the OIDC callback would, whatever the session backend."""
+    test_client = app.test_client()
+    with test_client.session_transaction() as session:
+        session['_user_id'] = username
+        session['_fresh'] = True
+    name = app.config['SESSION_COOKIE_NAME']
+    return next(f"{name}={cookie.value}" for cookie in test_client.cookie_jar if cookie.name == name)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(worker_class, args, url, port):
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_THREADS=str(args.threads), GUNICORN_ACCESS_LOG='', IP='127.0.0.1', PORT=str(port),
+               SQLALCHEMY_DATABASE_URI=url, SECRET_KEY=SECRET_KEY, SERVER_NAME=f'{HOST}:{port}',
+               PINGS_ENABLED='')
+    # The caller stops the server once the run is over.
+    server = subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, '-m', 'gunicorn', '--config=gunicorn.conf.py', 'rides:create_app()'], cwd=ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {server.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def hold_stream(port, cookie, stop):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        conn.request('GET', '/stream', headers={'Host': f'{HOST}:{port}', 'Cookie': cookie})
+        response = conn.getresponse()
+        while not stop.is_set():
+            try:
+                if not response.read1(1024):
+                    return
+            except socket.timeout:
+                pass
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def client(port, cookie, paths, deadline, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    n = 0
+    while time.monotonic() < deadline:
+        path = paths[n % len(paths)]
+        n += 1
+        began = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Host': f'{HOST}:{port}', 'Cookie': cookie, 'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+            latencies.append((time.perf_counter() - began) * 1000)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.close()
+
+
+def run(worker_class, args, url, cookie):
+    port = free_port()
+    server = start_gunicorn(worker_class, args, url, port)
+    stop = threading.Event()
+    try:
+        streams = [threading.Thread(target=hold_stream, args=(port, cookie, stop), daemon=True)
+                   for _ in range(args.streams)]
+        for stream in streams:
+            stream.start()
+        # Warm up every worker before measuring.
+        warmup = []
+        client(port, cookie, args.paths, time.monotonic() + 1, warmup, [])
+        latencies, errors = [], []
+        started = time.monotonic()
+        deadline = started + args.seconds
+        clients = [threading.Thread(target=client, args=(port, cookie, args.paths, deadline, latencies, errors))
+                   for _ in range(args.concurrency)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        # Requests in flight at the deadline are waited for, so the run can take longer.
+        elapsed = time.monotonic() - started
+    finally:
+        stop.set()
+        server.terminate()
+        server.wait(timeout=30)
+    return latencies, errors, elapsed
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='SQLAlchemy URL of an empty scratch database (default: temporary SQLite file)')
+    parser.add_argument('--worker-classes', nargs='+', choices=('sync', 'gthread', 'gevent'),
+                        default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads per gthread worker')
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--streams', type=int, default=0, help='live update streams held open during the run')
+    parser.add_argument('--paths', nargs='+', default=['/home', '/api/v1/events', '/history'])
+    parser.add_argument('--events', type=int, default=50, help='upcoming (and as many past) events')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        url = args.url or f"sqlite:///{os.path.join(scratch, 'load.db')}"
+        os.environ['SECRET_KEY'] = SECRET_KEY
+        rides, app = load_app(url)
+        with app.app_context():
+            rides.db.create_all()
+            seed(rides.db, rides.models, SimpleNamespace(events=args.events, cars=3, riders=3, users=100, requests=1))
+            rides.db.session.remove()
+            cookie = session_cookie(app, 'user0')
+        print(f"{'workers':<10}{'requests':>9}{'req/s':>9}{'p50_ms':>9}{'p90_ms':>9}{'p99_ms':>9}{'max_ms':>9}"
+              f"{'errors':>8}")
+        try:
+            for worker_class in args.worker_classes:
+                latencies, errors, elapsed = run(worker_class, args, url, cookie)
+                latencies.sort()
+                print(f'{worker_class:<10}{len(latencies):>9}{len(latencies) / elapsed:>9.1f}'
+                      f'{statistics.median(latencies) if latencies else float("nan"):>9.1f}'
+                      f'{percentile(latencies, 0.9):>9.1f}{percentile(latencies, 0.99):>9.1f}'
+                      f'{latencies[-1] if latencies else float("nan"):>9.1f}{len(errors):>8}')
+        finally:
+            with app.app_context():
+                rides.db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
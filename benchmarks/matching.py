@@ -0,0 +1,110 @@
+"""
+Time the Need a Ride matching engine as events grow, and check its work.
+
+For each --sizes N, seeds an event with N riders waiting in Need a Ride and
+enough cars of --seats seats for --coverage of them, a fifth of which leave
+too late to take anyone. Then runs one match of the event, in one
+transaction, and reports the time taken, SQL statements issued and riders
+seated.
+
+    python benchmarks/matching.py --sizes 100 500 1000 5000
+
+Runs against a throwaway SQLite file unless --url points somewhere else;
+the target database is created from the models and dropped afterwards.
+Exits non-zero if a car is overbooked, a seat count is off, or a rider is
+seated in a car that does not fit the event.
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(url):
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import rides  # pylint: disable=import-outside-toplevel
+    return rides.create_app({'SQLALCHEMY_DATABASE_URI': url, 'PINGS_ENABLED': False}), rides.db
+
+
+def seed_event(db, models, size, seats, coverage):
+    """An event with `size` riders waiting and cars for `coverage` of them. Returns its id."""
+    start = datetime.datetime.now() + datetime.timedelta(days=1)
+    end = start + datetime.timedelta(hours=3)
+    event = models.Event(f'Matching {size}', 'Somewhere', start, end, 'host')
+    db.session.add(event)
+    db.session.flush()
+    pool = models.Car('∞', 'Need a Ride', size, 0, start, end, '', event.id)
+    db.session.add(pool)
+    db.session.flush()
+    db.session.add_all(models.Rider(f'rider{n}', f'Rider {n}', pool.id, event.id) for n in range(size))
+    for n in range(max(1, round(size * coverage / seats))):
+        # Every fifth car leaves after the event has started.
+        departure = start + datetime.timedelta(hours=1) if n % 5 == 4 else start - datetime.timedelta(minutes=30)
+        db.session.add(models.Car(f'driver{n}', f'Driver {n}', 0, seats, departure, end, '', event.id))
+    db.session.commit()
+    return event.id
+
+
+def check(models, event_id, slack):
+    """Print and count cars that are overbooked, miscounted, or do not fit the event but took riders."""
+    failures = 0
+    pool = models.Car.query.filter(models.Car.event_id == event_id, models.Car.username == '∞').one()
+    for car in models.Car.query.filter(models.Car.event_id == event_id):
+        riders = models.Rider.query.filter(models.Rider.car_id == car.id).count()
+        if riders != car.current_capacity or car is not pool and riders > car.max_capacity:
+            print(f'car {car.id}: {riders} riders, capacity {car.current_capacity}/{car.max_capacity}')
+            failures += 1
+        if car is not pool and riders and car.departure_time > pool.departure_time + slack:
+            print(f'car {car.id}: leaves after the event starts but took {riders} riders')
+            failures += 1
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='SQLAlchemy URL of an empty scratch database (default: temporary SQLite file)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 100, 200, 500, 1000, 2000],
+                        help='riders waiting in each event')
+    parser.add_argument('--seats', type=int, default=4, help='seats per car')
+    parser.add_argument('--coverage', type=float, default=0.8,
+                        help='seats offered per waiting rider, counting the cars that leave too late')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        app, db = load_app(args.url or f"sqlite:///{os.path.join(scratch, 'matching.db')}")
+        # pylint: disable=import-outside-toplevel
+        from sqlalchemy import event
+        from rides import matching, models
+        with app.app_context():
+            db.create_all()
+            statements = []
+            event.listen(db.engine, 'before_cursor_execute', lambda *_args: statements.append(1))
+            slack = datetime.timedelta(minutes=int(app.config['MATCHING_SLACK_MINUTES']))
+            failures = 0
+            print(f"{'riders':>8}{'cars':>8}{'seated':>8}{'ms':>10}{'statements':>12}{'us/rider':>10}")
+            try:
+                for size in args.sizes:
+                    event_id = seed_event(db, models, size, args.seats, args.coverage)
+                    cars = models.Car.query.filter(models.Car.event_id == event_id).count() - 1
+                    db.session.remove()
+                    statements.clear()
+                    began = time.perf_counter()
+                    moves = matching.match([event_id])
+                    db.session.commit()
+                    elapsed = time.perf_counter() - began
+                    print(f'{size:>8}{cars:>8}{len(moves):>8}{elapsed * 1000:>10.1f}{len(statements):>12}'
+                          f'{elapsed / size * 1e6:>10.1f}')
+                    failures += check(models, event_id, slack)
+            finally:
+                db.session.remove()
+                db.drop_all()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
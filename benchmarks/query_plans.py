@@ -0,0 +1,140 @@
+"""
+Print query plans for the board's hot queries before and after the indexes
+added in migrations 7d2a4c6e8f10 and 9a3f5b7c1d24, plus the index DDL for
+SQLite and Postgres.
+
+    python benchmarks/query_plans.py
+    python benchmarks/query_plans.py --url postgresql://localhost/rideboard_scratch
+
+The target database must be empty; the script creates and drops its own tables.
+"""
+import argparse
+import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
+
+metadata = sa.MetaData()
+
+events = sa.Table('events', metadata,
+                  sa.Column('id', sa.Integer, primary_key=True),
+                  sa.Column('name', sa.String(150), nullable=False),
+                  sa.Column('address', sa.Text, nullable=False),
+                  sa.Column('start_time', sa.DateTime, nullable=False),
+                  sa.Column('end_time', sa.DateTime, nullable=False),
+                  sa.Column('creator', sa.String(50), nullable=False),
+                  sa.Column('expired', sa.Boolean, nullable=False),
+                  sa.Column('expires_at', sa.DateTime, nullable=False))
+cars = sa.Table('cars', metadata,
+                sa.Column('id', sa.Integer, primary_key=True),
+                sa.Column('username', sa.String(80), nullable=False),
+                sa.Column('name', sa.String(50), nullable=False),
+                sa.Column('current_capacity', sa.Integer, nullable=False),
+                sa.Column('max_capacity', sa.Integer, nullable=False),
+                sa.Column('departure_time', sa.DateTime, nullable=False),
+                sa.Column('return_time', sa.DateTime, nullable=False),
+                sa.Column('driver_comment', sa.Text),
+                sa.Column('event_id', sa.Integer, sa.ForeignKey('events.id'), nullable=False))
+riders = sa.Table('riders', metadata,
+                  sa.Column('id', sa.Integer, primary_key=True),
+                  sa.Column('username', sa.String(80), nullable=False),
+                  sa.Column('name', sa.String(50), nullable=False),
+                  sa.Column('car_id', sa.Integer, sa.ForeignKey('cars.id'), nullable=False),
+                  sa.Column('event_id', sa.Integer, sa.ForeignKey('events.id'), nullable=False))
+
+# Mirrors migrations/versions/7d2a4c6e8f10_.py and 9a3f5b7c1d24_.py.
+INDEXES = [
+    sa.Index('uq_riders_event_id_username', riders.c.event_id, riders.c.username, unique=True),
+    sa.Index('ix_riders_car_id', riders.c.car_id),
+    sa.Index('ix_riders_username_car_id', riders.c.username, riders.c.car_id),
+    sa.Index('ix_cars_event_id_name', cars.c.event_id, cars.c.name),
+    sa.Index('ix_cars_username_event_id', cars.c.username, cars.c.event_id),
+    sa.Index('ix_events_expired_start_time', events.c.expired, events.c.start_time),
+    sa.Index('ix_events_start_time_id', events.c.start_time, events.c.id),
+]
+for _index in INDEXES:
+    # Keep create_all() from building them; main() creates them after the "before" plans.
+    _index.table.indexes.discard(_index)
+
+# The statements rides/__init__.py issues on every board view and ride change.
+QUERIES = {
+    'board': sa.select(events).where(events.c.expired == sa.false(), events.c.expires_at >= sa.func.current_timestamp())
+             .order_by(events.c.start_time.asc()),
+    'history page': sa.select(events).where(sa.or_(events.c.expired == sa.true(),
+                                                   events.c.expires_at < sa.func.current_timestamp()),
+                                            sa.tuple_(events.c.start_time, events.c.id) <
+                                            sa.tuple_(sa.func.current_timestamp(), 500))
+                    .order_by(events.c.start_time.desc(), events.c.id.desc()).limit(21),
+    'board cars': sa.select(cars).where(cars.c.event_id.in_([1, 2, 3])),
+    'board riders': sa.select(riders).where(riders.c.car_id.in_([1, 2, 3])),
+    'user rides': sa.select(riders).where(riders.c.username == 'user7'),
+    'user drives': sa.select(cars).where(cars.c.username == 'user7'),
+    'leave ride': sa.select(riders).where(riders.c.username == 'user7', riders.c.car_id == 11),
+    'need a ride car': sa.select(cars).where(cars.c.event_id == 3, cars.c.name == 'Need a Ride'),
+    'in event': sa.select(riders.c.id).where(riders.c.event_id == 3, riders.c.username == 'user7'),
+}
+
+
+def seed(conn, num_events):
+    now = datetime.datetime.now()
+    conn.execute(events.insert(), [
+        {'id': i, 'name': f'event {i}', 'address': 'somewhere', 'creator': f'user{i % 50}',
+         'start_time': now + datetime.timedelta(hours=i), 'end_time': now + datetime.timedelta(hours=i + 2),
+         'expires_at': now + datetime.timedelta(hours=i + 3), 'expired': i < num_events * 0.9}
+        for i in range(1, num_events + 1)])
+    conn.execute(cars.insert(), [
+        {'id': i, 'username': f'user{i % 50}', 'name': 'Need a Ride' if i % 5 == 0 else 'driver',
+         'current_capacity': 2, 'max_capacity': 4, 'departure_time': now, 'return_time': now,
+         'driver_comment': '', 'event_id': i // 5 + 1}
+        for i in range(1, num_events * 5)])
+    conn.execute(riders.insert(), [
+        {'id': i, 'username': f'user{i % 50}', 'name': 'rider', 'car_id': i // 2 + 1, 'event_id': i // 10 + 1}
+        for i in range(1, num_events * 10)])
+
+
+def explain(conn, query):
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    sql = str(query.compile(conn, compile_kwargs={'literal_binds': True}))
+    return [' '.join(str(col) for col in row) for row in conn.exec_driver_sql(prefix + sql)]
+
+
+def print_plans(conn, title):
+    print(f'== {title} ==')
+    for name, query in QUERIES.items():
+        print(f'-- {name}')
+        for line in explain(conn, query):
+            print(f'   {line}')
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='sqlite://', help='SQLAlchemy URL of an empty scratch database')
+    parser.add_argument('--events', type=int, default=2000, help='number of events to seed')
+    args = parser.parse_args()
+
+    print('== index DDL ==')
+    for dialect in (sqlite.dialect(), postgresql.dialect()):
+        print(f'-- {dialect.name}')
+        for index in INDEXES:
+            print(f'   {str(CreateIndex(index).compile(dialect=dialect)).strip()};')
+    print()
+
+    engine = sa.create_engine(args.url)
+    with engine.begin() as conn:
+        metadata.create_all(conn)
+        try:
+            seed(conn, args.events)
+            conn.exec_driver_sql('ANALYZE')
+            print_plans(conn, 'before')
+            for index in INDEXES:
+                index.create(conn)
+            conn.exec_driver_sql('ANALYZE')
+            print_plans(conn, 'after')
+        finally:
+            metadata.drop_all(conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+Benchmark the main rideboard routes against a seeded synthetic board.
+
+Seeds a scratch database with --events upcoming and --events past events,
+each with --cars cars of --riders riders drawn from --users users, then drives
+index, history, join_ride, leave_ride, carform and delete_ride through the
+Flask test client, logged in by setting the Flask-Login session directly (no
+SSO involved). For every route it reports latency percentiles, SQL statements,
+ORM rows loaded and kilobytes sent per request.
+
+    python benchmarks/routes.py --events 200 --requests 50 --save before.json
+    python benchmarks/routes.py --events 200 --requests 50 --compare before.json
+
+Results are saved as JSON with the commit they were taken at, so runs can be
+compared across commits.
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# index_revalidate sends the ETag of the previous response, as a browser reloading the board would.
+ROUTES = ('index', 'index_revalidate', 'history', 'join_ride', 'leave_ride', 'carform', 'delete_ride')
+
+
+def load_app(url):
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import rides  # pylint: disable=import-outside-toplevel
+    app = rides.create_app({
+        'SQLALCHEMY_DATABASE_URI': url,
+        'WTF_CSRF_ENABLED': False,
+        'LIVE_BACKEND': 'memory',
+        'PINGS_ENABLED': False
+    })
+    return rides, app
+
+
+class Counter:
+    """Counts SQL statements and ORM rows loaded while attached."""
+
+    def __init__(self, engine):
+        # pylint: disable=import-outside-toplevel
+        from sqlalchemy import event
+        from sqlalchemy.orm import Mapper
+        self.queries = self.rows = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+        event.listen(Mapper, 'load', self._on_load)
+
+    def reset(self):
+        self.queries = self.rows = 0
+
+    def _on_execute(self, *_args):
+        self.queries += 1
+
+    def _on_load(self, *_args):
+        self.rows += 1
+
+
+def seed(db, models, args):
+    """
+    Fill the board. Returns the ids the scenarios need: a roomy car to join,
+    an event to add cars to, and events owned by the benchmark user to delete.
+    """
+    now = datetime.datetime.now()
+    users = [f'user{n}' for n in range(args.users)]
+    db.session.add_all(models.User(u, 'User', str(n), '') for n, u in enumerate(users))
+    db.session.add_all(models.User(f'bench{n}', 'Bench', str(n), '') for n in range(args.requests))
+
+    def add_event(name, start, creator):
+        event = models.Event(name, 'Somewhere', start, start + datetime.timedelta(hours=3), creator)
+        db.session.add(event)
+        db.session.flush()
+        db.session.add(models.Car('∞', 'Need a Ride', 0, 0, event.start_time, event.end_time, '', event.id))
+        # Drivers and riders are distinct users, so nobody rides twice in an event.
+        people = iter(users[(event.id * 7) % len(users):] + users[:(event.id * 7) % len(users)])
+        for _ in range(args.cars):
+            driver = next(people)
+            car = models.Car(driver, f'User {driver}', args.riders, args.riders + 2, event.start_time,
+                             event.end_time, 'Meet out front', event.id)
+            db.session.add(car)
+            db.session.flush()
+            for _ in range(args.riders):
+                rider = next(people)
+                db.session.add(models.Rider(rider, f'User {rider}', car.id, event.id))
+        return event
+
+    for n in range(args.events):
+        add_event(f'Upcoming {n}', now + datetime.timedelta(days=1, hours=n), users[n % len(users)])
+        add_event(f'Past {n}', now - datetime.timedelta(days=2, hours=n), users[n % len(users)])
+    target = add_event('Benchmark', now + datetime.timedelta(days=2), 'bench0')
+    roomy = models.Car('bench-driver', 'Bench Driver', 0, args.requests, target.start_time, target.end_time, '',
+                       target.id)
+    db.session.add(roomy)
+    doomed = [add_event(f'Doomed {n}', now + datetime.timedelta(days=3, hours=n), 'bench0').id
+              for n in range(args.requests)]
+    db.session.commit()
+    return {'event_id': target.id, 'car_id': roomy.id, 'doomed': doomed}
+
+
+def scenarios(ids):
+    """Per route, a function from the iteration number to (user, method, path, form data)."""
+    later = datetime.datetime.now() + datetime.timedelta(days=2)
+    car_form = {
+        'max_capacity-max_capacity': '4',
+        'departure_date_time': later.strftime('%Y-%m-%d %H:%M'),
+        'return_date_time': (later + datetime.timedelta(hours=3)).strftime('%Y-%m-%d %H:%M'),
+        'comments': 'Benchmark car'
+    }
+    return {
+        'index': lambda n: ('user0', 'GET', '/home', None),
+        'index_revalidate': lambda n: ('user0', 'GET', '/home', None),
+        'history': lambda n: ('user0', 'GET', '/history', None),
+        'join_ride': lambda n: (f'bench{n}', 'POST', f"/join/{ids['car_id']}/bench{n}", None),
+        'leave_ride': lambda n: (f'bench{n}', 'POST', f"/delete/rider/{ids['car_id']}/bench{n}", None),
+        'carform': lambda n: (f'bench{n}', 'POST', f"/carform/{ids['event_id']}", car_form),
+        'delete_ride': lambda n: ('bench0', 'POST', f"/delete/ride/{ids['doomed'][n]}", None)
+    }
+
+
+def orphans(models):
+    """Cars and riders left behind by deleted events and cars; cascading deletes should leave none."""
+    def missing(child, parent, column):
+        return child.query.outerjoin(parent, column == parent.id).filter(parent.id.is_(None)).count()
+    return (missing(models.Car, models.Event, models.Car.event_id)
+            + missing(models.Rider, models.Car, models.Rider.car_id)
+            + missing(models.Rider, models.Event, models.Rider.event_id))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def drive(app, counter, route, requests, accept_encoding, revalidate=False):
+    """Issue `requests` requests for one route; returns its summary."""
+    client = app.test_client()
+    samples = {'latency': [], 'queries': [], 'rows': [], 'size': []}
+    errors = 0
+    etag = None
+    for n in range(requests):
+        user, method, path, data = route(n)
+        headers = {'Accept-Encoding': accept_encoding}
+        if revalidate and etag:
+            headers['If-None-Match'] = etag
+        with client.session_transaction() as session:
+            session['_user_id'] = user
+            session['_fresh'] = True
+        counter.reset()
+        began = time.perf_counter()
+        response = client.open(path, method=method, data=data, headers=headers)
+        samples['latency'].append(time.perf_counter() - began)
+        samples['queries'].append(counter.queries)
+        samples['rows'].append(counter.rows)
+        samples['size'].append(len(response.get_data()))
+        etag = response.headers.get('ETag', etag)
+        if response.status_code >= 400:
+            errors += 1
+    latencies = samples['latency']
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'queries': statistics.mean(samples['queries']),
+        'max_queries': max(samples['queries']),
+        'rows': statistics.mean(samples['rows']),
+        'kb': statistics.mean(samples['size']) / 1024
+    }
+
+
+def report(results, baseline=None):
+    columns = ('p50_ms', 'p90_ms', 'p99_ms', 'queries', 'rows', 'kb')
+    print(f"{'route':<17}" + ''.join(f'{c:>22}' for c in columns) + f"{'errors':>8}")
+    for name, result in results.items():
+        line = f'{name:<17}'
+        for column in columns:
+            value = result[column]
+            old = baseline.get(name, {}).get(column) if baseline else None
+            if old is None:
+                line += f'{value:>22.1f}'
+            else:
+                change = f'({(value - old) / old:+.0%})' if old else ''
+                line += f'{old:>9.1f} ->{value:>6.1f} {change:>5}'
+        print(line + f"{result['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='SQLAlchemy URL of an empty scratch database (default: temporary SQLite file)')
+    parser.add_argument('--events', type=int, default=100, help='upcoming events, and as many past events')
+    parser.add_argument('--cars', type=int, default=3, help='cars per event, besides Need a Ride')
+    parser.add_argument('--riders', type=int, default=2, help='riders per car')
+    parser.add_argument('--users', type=int, default=500, help='users to draw drivers and riders from')
+    parser.add_argument('--requests', type=int, default=50, help='requests per route')
+    parser.add_argument('--routes', nargs='+', choices=ROUTES, default=list(ROUTES), help='routes to drive')
+    parser.add_argument('--accept-encoding', default='br, gzip',
+                        help='Accept-Encoding sent with every request; \'\' for uncompressed (default: br, gzip)')
+    parser.add_argument('--archive', action='store_true',
+                        help='expire and archive the past events before driving, so history reads the archive')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier --save to compare against')
+    args = parser.parse_args()
+    if args.users < 2 * (1 + args.cars * (args.riders + 1)):
+        parser.error('not enough --users to fill an event without anyone riding twice')
+
+    with tempfile.TemporaryDirectory() as scratch:
+        rides, app = load_app(args.url or f"sqlite:///{os.path.join(scratch, 'routes.db')}")
+        from rides import models  # pylint: disable=import-outside-toplevel
+        db = rides.db
+        with app.app_context():
+            db.create_all()
+            began = time.perf_counter()
+            ids = seed(db, models, args)
+            print(f'seeded {args.events * 2} events in {time.perf_counter() - began:.1f}s')
+            if args.archive:
+                models.Event.expire(rides.local_now())
+                print(f'archived {models.ArchivedEvent.archive(500)} events')
+            counter = Counter(db.engine)
+        # Requests run outside that app context, so each one gets a fresh session like in production.
+        try:
+            routes = scenarios(ids)
+            # One untimed request so template compilation is not billed to the first route.
+            drive(app, counter, routes['index'], 1, args.accept_encoding)
+            results = {name: drive(app, counter, routes[name], args.requests, args.accept_encoding,
+                                   revalidate=name == 'index_revalidate')
+                       for name in args.routes}
+            with app.app_context():
+                left_behind = orphans(models)
+        finally:
+            with app.app_context():
+                db.drop_all()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['routes']
+    report(results, baseline)
+    if left_behind:
+        print(f'{left_behind} orphaned car(s) or rider(s) left behind')
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'commit': rides.git_commit(),
+                'taken_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                'args': vars(args),
+                'routes': results
+            }, f, indent=2)
+    sys.exit(1 if left_behind else 0)
+
+
+if __name__ == '__main__':
+    main()
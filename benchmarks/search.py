@@ -0,0 +1,103 @@
+"""
+Time event search as history grows: a search should cost about the same
+whatever the number of events.
+
+For each --sizes N, fills a scratch database with N events (half of them
+archived) and their search index, then runs each of --queries through
+/search as a logged in user, --repeat times, and reports the median and
+worst latency and the SQL statements per request.
+
+    python benchmarks/search.py --sizes 1000 10000 50000
+
+Runs against a throwaway SQLite file unless --url points somewhere else;
+the target database is created from the models and dropped afterwards.
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NAMES = ('Bowling night', 'Ski trip', 'Dinner at Dinosaur', 'Apple picking', 'Hackathon', 'Concert')
+ADDRESSES = ('Bowl America, Henrietta', 'Bristol Mountain', 'Dinosaur Bar-B-Que, Rochester', 'Schutt\'s Farm',
+             'Golisano Hall', 'Blue Cross Arena')
+
+
+def load_app(url):
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import rides  # pylint: disable=import-outside-toplevel
+    return rides.create_app({'SQLALCHEMY_DATABASE_URI': url}), rides.db
+
+
+def seed(db, models, search, first, count):
+    """Add events `first` to `first + count` and index them."""
+    start = datetime.datetime(2000, 1, 1)
+    rows = []
+    for event_id in range(first, first + count):
+        when = start + datetime.timedelta(hours=event_id)
+        rows.append({'id': event_id, 'name': f'{NAMES[event_id % len(NAMES)]} {event_id}',
+                     'address': ADDRESSES[event_id % len(ADDRESSES)], 'start_time': when, 'end_time': when,
+                     'creator': 'host', 'expired': event_id % 2 == 0, 'expires_at': when, 'version': 0})
+    db.session.execute(models.Event.__table__.insert(), rows)
+    for row in rows:
+        search.index_event(SimpleNamespace(**row))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='SQLAlchemy URL of an empty scratch database (default: temporary SQLite file)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000], help='events in the tables')
+    parser.add_argument('--queries', nargs='+', default=['bowl', 'ski bristol', 'rochester', 'nothing'])
+    parser.add_argument('--repeat', type=int, default=20, help='requests per query')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        app, db = load_app(args.url or f"sqlite:///{os.path.join(scratch, 'search.db')}")
+        from sqlalchemy import event  # pylint: disable=import-outside-toplevel
+        from rides import models, search  # pylint: disable=import-outside-toplevel
+        with app.app_context():
+            db.create_all()
+            db.session.add(models.User('user', 'Search', 'User', ''))
+            db.session.commit()
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = 'user'
+            session['_fresh'] = True
+        statements = []
+
+        def count(*_):
+            statements.append(1)
+        print(f"{'events':>8}  {'query':<14}{'median ms':>10}{'max ms':>8}{'SQL':>5}")
+        seeded = 0
+        try:
+            for size in args.sizes:
+                with app.app_context():
+                    seed(db, models, search, seeded + 1, size - seeded)
+                    seeded = size
+                    models.ArchivedEvent.archive(1000)
+                    engine = db.engine
+                event.listen(engine, 'before_cursor_execute', count)
+                for query in args.queries:
+                    times = []
+                    for _ in range(args.repeat):
+                        statements.clear()
+                        began = time.perf_counter()
+                        client.get('/search', query_string={'q': query})
+                        times.append((time.perf_counter() - began) * 1000)
+                    print(f'{size:>8}  {query:<14}{statistics.median(times):>10.2f}{max(times):>8.2f}'
+                          f'{len(statements):>5}')
+                event.remove(engine, 'before_cursor_execute', count)
+        finally:
+            with app.app_context():
+                db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
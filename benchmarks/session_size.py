@@ -0,0 +1,115 @@
+"""
+Compare session backends: what a logged in browser uploads with every
+request, and what it costs the server to open the session.
+
+For each --backends, logs a user in the way flask-pyoidc and Flask-Login
+would (userinfo, ID token, access and refresh tokens), then reports the size
+of the Cookie header, the time to open the session from it (verify and decode
+the cookie, or look the id up and decode the stored data), and the latency
+of --path over --requests requests.
+
+    python benchmarks/session_size.py --backends cookie database filesystem
+
+Runs against a throwaway SQLite file unless --url points somewhere else.
+"""
+import argparse
+import base64
+import os
+import secrets
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(url, backend, scratch):
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import rides  # pylint: disable=import-outside-toplevel
+    app = rides.create_app({'SQLALCHEMY_DATABASE_URI': url, 'SESSION_BACKEND': backend,
+                            'SESSION_DIR': os.path.join(scratch, 'sessions')})
+    return rides, app
+
+
+def token(size):
+    """Random JWT-shaped token of about `size` characters."""
+    return '.'.join(base64.urlsafe_b64encode(secrets.token_bytes(size // 4)).decode().rstrip('=') for _ in range(3))
+
+
+def login(app, username):
+    """Fill a session as a CSH login does and return the Cookie header the browser would send."""
+    client = app.test_client()
+    now = int(time.time())
+    userinfo = {
+        'sub': secrets.token_hex(16), 'preferred_username': username, 'given_name': 'Session', 'family_name': 'User',
+        'name': 'Session User', 'email': f'{username}@csh.rit.edu', 'email_verified': True,
+        'groups': ['member', 'active', 'current_student', 'drink', 'rtp', 'eboard', 'webmaster', 'intro']
+    }
+    with client.session_transaction() as session:
+        session.permanent = True
+        session.update({
+            'current_provider': 'default',
+            'access_token': token(1400),
+            'refresh_token': token(700),
+            'access_token_expires_at': now + 300,
+            'id_token': dict(userinfo, iss='https://sso.csh.rit.edu/auth/realms/csh', aud='rideboard', exp=now + 300,
+                             iat=now, auth_time=now, nonce=secrets.token_urlsafe(16)),
+            'id_token_jwt': token(1300),
+            'userinfo': userinfo,
+            'last_authenticated': now,
+            'last_session_refresh': now,
+            '_user_id': username,
+            '_fresh': True
+        })
+    name = app.config['SESSION_COOKIE_NAME']
+    return next(f"{name}={cookie.value}" for cookie in client.cookie_jar if cookie.name == name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='SQLAlchemy URL of an empty scratch database (default: temporary SQLite file)')
+    parser.add_argument('--backends', nargs='+', choices=('cookie', 'database', 'filesystem'),
+                        default=['cookie', 'database', 'filesystem'])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--path', default='/api/v1/events')
+    args = parser.parse_args()
+
+    print(f"{'backend':<12}{'cookie_bytes':>13}{'open_us':>9}{'p50_ms':>8}{'p90_ms':>8}")
+    with tempfile.TemporaryDirectory() as scratch:
+        for backend in args.backends:
+            rides, app = load_app(args.url or f"sqlite:///{os.path.join(scratch, 'sessions.db')}", backend, scratch)
+            from rides import models  # pylint: disable=import-outside-toplevel
+            with app.app_context():
+                rides.db.create_all()
+                if models.User.query.get('user') is None:
+                    rides.db.session.add(models.User('user', 'Session', 'User', ''))
+                    rides.db.session.commit()
+            try:
+                cookie = login(app, 'user')
+                with app.test_request_context(headers={'Cookie': cookie}):
+                    from flask import request  # pylint: disable=import-outside-toplevel
+                    began = time.perf_counter()
+                    for _ in range(args.requests):
+                        app.session_interface.open_session(app, request)
+                    opening = (time.perf_counter() - began) / args.requests
+                client = app.test_client(use_cookies=False)
+                times = []
+                for _ in range(args.requests):
+                    began = time.perf_counter()
+                    response = client.get(args.path, headers={'Cookie': cookie})
+                    times.append((time.perf_counter() - began) * 1000)
+                    if response.status_code != 200:
+                        print(f'{args.path} returned {response.status_code}')
+                        break
+                times.sort()
+                print(f'{backend:<12}{len(f"Cookie: {cookie}"):>13}{opening * 1e6:>9.0f}'
+                      f'{statistics.median(times):>8.2f}{times[int(len(times) * 0.9)]:>8.2f}')
+            finally:
+                with app.app_context():
+                    rides.db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
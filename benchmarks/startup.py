@@ -0,0 +1,114 @@
+"""
+Measure how long a fresh worker takes to get going: a cold `import rides`,
+building the app with create_app, and serving its first request (/home for a
+logged-in user). Every run happens in a new interpreter so nothing is warm.
+
+    python benchmarks/startup.py --runs 10 --save startup.json
+    python benchmarks/startup.py --baseline startup.json
+
+With --baseline, exits non-zero if any median is more than --threshold
+slower than the baseline's (and by more than --min-delta seconds, so that
+noise on tiny numbers is not reported as a regression).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+METRICS = ('import', 'create_app', 'first_request')
+
+# Runs in a new interpreter; argv[1] is the database URL. Prints one JSON line of timings.
+CHILD = '''
+import json, sys, time
+began = time.perf_counter()
+import rides
+imported = time.perf_counter()
+app = rides.create_app({"SQLALCHEMY_DATABASE_URI": sys.argv[1]})
+created = time.perf_counter()
+with app.app_context():
+    from rides.models import User
+    rides.db.create_all()
+    rides.db.session.add(User("startup", "Start", "Up", ""))
+    rides.db.session.commit()
+client = app.test_client()
+with client.session_transaction() as session:
+    session["_user_id"] = "startup"
+ready = time.perf_counter()
+response = client.get("/home")
+served = time.perf_counter()
+if response.status_code != 200:
+    sys.exit("GET /home returned %d" % response.status_code)
+print(json.dumps({"import": imported - began, "create_app": created - imported, "first_request": served - ready}))
+'''
+
+
+def run_once(scratch, n):
+    url = f"sqlite:///{os.path.join(scratch, f'startup{n}.db')}"
+    output = subprocess.run([sys.executable, '-c', CHILD, url], cwd=ROOT, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    summary = {}
+    for metric in METRICS:
+        values = [run[metric] for run in runs]
+        summary[metric] = {
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values)
+        }
+    return summary
+
+
+def compare(summary, baseline, threshold, min_delta):
+    """Print each median against the baseline's; returns how many regressed."""
+    regressions = 0
+    for metric in METRICS:
+        new, old = summary[metric]["median"], baseline[metric]["median"]
+        change = (new - old) / old if old else 0.0
+        regressed = new > old * (1 + threshold) and new - old > min_delta
+        regressions += regressed
+        print(f"{metric:>14}: {old * 1000:8.1f} ms -> {new * 1000:8.1f} ms ({change:+.0%})"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters to time')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file from an earlier --save to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown of a median over the baseline, as a fraction (default: 0.25)')
+    parser.add_argument('--min-delta', type=float, default=0.01,
+                        help='slowdowns smaller than this many seconds are never regressions (default: 0.01)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        summary = summarize([run_once(scratch, n) for n in range(args.runs)])
+
+    for metric in METRICS:
+        stats = summary[metric]
+        print(f"{metric:>14}: median {stats['median'] * 1000:8.1f} ms  "
+              f"min {stats['min'] * 1000:8.1f} ms  max {stats['max'] * 1000:8.1f} ms")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f'\ncompared with {args.baseline}:')
+        if compare(summary, baseline, args.threshold, args.min_delta):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,10 +5,73 @@ from os import environ as env
 IP = env.get('IP', '0.0.0.0')
 PORT = env.get('PORT', 8080)
 SERVER_NAME = env.get('SERVER_NAME', 'rideboard.csh.rit.edu')
+# Commit shown in the footer, set at image build time; looked up with git when unset
+RIDEBOARD_COMMIT = env.get('RIDEBOARD_COMMIT')
 
 # DB Info
 SQLALCHEMY_DATABASE_URI = env.get('SQLALCHEMY_DATABASE_URI')
 SQLALCHEMY_TRACK_MODIFICATIONS = 'False'
+# Connections per worker process and engine: gunicorn threads in the pool, plus overflow for bursts.
+# Connections are recycled before the server or a proxy drops them, and pinged before use.
+SQLALCHEMY_POOL_SIZE = env.get('SQLALCHEMY_POOL_SIZE', 5)
+SQLALCHEMY_MAX_OVERFLOW = env.get('SQLALCHEMY_MAX_OVERFLOW', 5)
+SQLALCHEMY_POOL_RECYCLE = env.get('SQLALCHEMY_POOL_RECYCLE', 1800)
+SQLALCHEMY_POOL_PRE_PING = env.get('SQLALCHEMY_POOL_PRE_PING', 'true').lower() == 'true'
+# Read replica for the read-only pages and feeds; unset reads everything from the primary
+SQLALCHEMY_REPLICA_URI = env.get('SQLALCHEMY_REPLICA_URI')
+# Seconds a user who has just written keeps reading from the primary
+REPLICA_STICKY_SECONDS = env.get('REPLICA_STICKY_SECONDS', 10)
+
+# Where session data lives: "cookie" keeps it all in Flask's signed cookie; "database" (run `flask db upgrade`
+# first, for the sessions table) or "filesystem" (shared by workers on a host) keep only an id in the cookie
+SESSION_BACKEND = env.get('SESSION_BACKEND', 'cookie')
+SESSION_DIR = env.get('SESSION_DIR', '/tmp/rideboard-sessions')
+# Seconds a server-side session lasts after it was last saved; `flask prune-sessions` deletes expired ones
+SESSION_TTL = env.get('SESSION_TTL', 7 * 24 * 60 * 60)
+
+# Past events shown per page of /history
+HISTORY_PAGE_SIZE = env.get('HISTORY_PAGE_SIZE', 20)
+
+# Expired events moved into the archive tables per transaction by `flask archive-events`
+ARCHIVE_BATCH_SIZE = env.get('ARCHIVE_BATCH_SIZE', 500)
+
+# Results per page of /search, and the deepest page served
+SEARCH_PAGE_SIZE = env.get('SEARCH_PAGE_SIZE', 20)
+SEARCH_MAX_PAGES = env.get('SEARCH_MAX_PAGES', 10)
+# Newest matching events ranked per search
+SEARCH_CANDIDATES = env.get('SEARCH_CANDIDATES', 1000)
+
+# Live board updates: "database" fans out across gunicorn workers, "memory" only within one process
+LIVE_BACKEND = env.get('LIVE_BACKEND', 'database')
+# Seconds between board_changes polls, between keepalives, and before a stream is handed back
+LIVE_POLL_INTERVAL = env.get('LIVE_POLL_INTERVAL', 1)
+LIVE_HEARTBEAT = env.get('LIVE_HEARTBEAT', 15)
+LIVE_STREAM_SECONDS = env.get('LIVE_STREAM_SECONDS', 300)
+
+# Cache for rendered event cards: "lru" (per process), "filesystem" (shared by workers on a host) or "none"
+FRAGMENT_CACHE = env.get('FRAGMENT_CACHE', 'lru')
+FRAGMENT_CACHE_SIZE = env.get('FRAGMENT_CACHE_SIZE', 512)
+FRAGMENT_CACHE_DIR = env.get('FRAGMENT_CACHE_DIR', '/tmp/rideboard-cache')
+
+# Per-process cache of logged in users: entries, and seconds before a profile change elsewhere shows up
+USER_CACHE_SIZE = env.get('USER_CACHE_SIZE', 1024)
+USER_CACHE_TTL = env.get('USER_CACHE_TTL', 300)
+
+# Request metrics: bearer token required by /metrics (unset, /metrics is not served), and a log (with SQL) of
+# requests slower than this many ms
+METRICS_TOKEN = env.get('METRICS_TOKEN', '')
+SLOW_REQUEST_MS = env.get('SLOW_REQUEST_MS', 0)
+
+# Riders in Need a Ride are matched to cars leaving at most this many minutes after the event starts
+# and returning at most this many minutes before it ends
+MATCHING_SLACK_MINUTES = env.get('MATCHING_SLACK_MINUTES', 30)
+
+# Compress dynamic responses larger than this many bytes, and let browsers keep static files for a day
+COMPRESS_MIN_SIZE = env.get('COMPRESS_MIN_SIZE', 500)
+SEND_FILE_MAX_AGE_DEFAULT = int(env.get('SEND_FILE_MAX_AGE_DEFAULT', 86400))
+
+# Comma-separated usernames allowed to export every event, car and rider from /admin/export.csv and .ndjson
+ADMINS = env.get('ADMINS', '')
 
 # Openshift secret
 SECRET_KEY = env.get("SECRET_KEY", default='SECRET-KEY')
@@ -34,3 +97,8 @@ PINGS_JOIN_ROUTE_UUID = env.get("PINGS_JOIN_ROUTE_UUID", None)
 PINGS_LEAVE_ROUTE_UUID = env.get("PINGS_LEAVE_ROUTE_UUID", None)
 PINGS_TOKEN = env.get("PINGS_TOKEN", "")
 PINGS_ENABLED = env.get("PINGS_ENABLED", False)
+PINGS_URL = env.get("PINGS_URL", "https://pings.csh.rit.edu")
+# Seconds to wait on Pings per attempt, attempts per ping, and the base retry delay (doubled per retry)
+PINGS_TIMEOUT = env.get("PINGS_TIMEOUT", 5)
+PINGS_MAX_ATTEMPTS = env.get("PINGS_MAX_ATTEMPTS", 4)
+PINGS_BACKOFF = env.get("PINGS_BACKOFF", 0.5)
@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+
+# gunicorn settings, from the environment. gunicorn reads this file from the
+# working directory; `benchmarks/load.py` compares the worker models under load.
+#
+#   sync     One request at a time per process. A slow query, a Pings call or
+#            an open live stream takes the whole worker out of service.
+#   gthread  GUNICORN_THREADS requests at a time per process. The default.
+#   gevent   Up to GUNICORN_WORKER_CONNECTIONS requests per process, switching
+#            whenever one waits on the network. Postgres queries only yield
+#            with psycogreen installed, otherwise they block the worker.
+
+env = os.environ
+
+WORKER_CLASSES = ('sync', 'gthread', 'gevent')
+
+bind = f"{env.get('IP', '0.0.0.0')}:{env.get('PORT', 8080)}"
+worker_class = env.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class not in WORKER_CLASSES:
+    raise ValueError(f"GUNICORN_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}, not {worker_class!r}")
+workers = int(env.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(env.get('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(env.get('GUNICORN_WORKER_CONNECTIONS', 100))
+# Seconds an idle keep-alive connection stays open; keep it below the proxy's idle timeout.
+keepalive = int(env.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(env.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(env.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Load the app once in the master and fork it. gevent must patch the standard
+# library before the app is imported, so it always loads in each worker.
+preload_app = env.get('GUNICORN_PRELOAD', 'false').lower() == 'true' and worker_class != 'gevent'
+# Access log to stdout; set GUNICORN_ACCESS_LOG empty to turn it off.
+accesslog = env.get('GUNICORN_ACCESS_LOG', '-') or None
+
+# The app reads these when it loads, so they can follow the worker model
+# unless they are set explicitly. Each thread or greenlet can hold a database
+# connection at once; the overflow covers the live updates poller.
+env.setdefault('SQLALCHEMY_POOL_SIZE', str(threads if worker_class != 'gevent' else min(worker_connections, 10)))
+if worker_class == 'sync':
+    # A sync worker serving a request for longer than the timeout is killed, streams included.
+    env.setdefault('LIVE_STREAM_SECONDS', str(max(timeout // 2, 1)))
+
+
+def on_starting(server):
+    if workers > 1 and env.get('LIVE_BACKEND') == 'memory':
+        server.log.warning("LIVE_BACKEND=memory only reaches subscribers of the same worker; use database")
+    if worker_class == 'sync':
+        server.log.warning("Each open live stream holds a sync worker; prefer gthread or gevent")
+
+
+def post_fork(server, _worker):
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            server.log.warning("psycogreen is not installed, so Postgres queries block gevent workers")
+        else:
+            patch_psycopg()
+    if preload_app:
+        # Connections opened while loading the app belong to the master; each worker opens its own.
+        from rides import db  # pylint: disable=import-outside-toplevel
+        with server.app.wsgi().app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
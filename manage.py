@@ -1,7 +1,9 @@
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
 
-from rides import app, db
+from rides import create_app, db
+
+app = create_app()
 
 migrate = Migrate(app, db)
 manager = Manager(app)
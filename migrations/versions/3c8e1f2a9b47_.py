@@ -0,0 +1,33 @@
+"""add events.expires_at
+
+Revision ID: 3c8e1f2a9b47
+Revises: 5b1f4c9d0d43
+Create Date: 2026-10-18 10:12:03.418215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8e1f2a9b47'
+down_revision = '5b1f4c9d0d43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('events', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    # Events expire one hour after they end.
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE events SET expires_at = datetime(end_time, '+1 hour')")
+    else:
+        op.execute("UPDATE events SET expires_at = end_time + INTERVAL '1 hour'")
+    with op.batch_alter_table('events') as batch_op:
+        batch_op.alter_column('expires_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index(op.f('ix_events_expires_at'), 'events', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_events_expires_at'), table_name='events')
+    op.drop_column('events', 'expires_at')
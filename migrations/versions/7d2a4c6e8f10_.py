@@ -0,0 +1,51 @@
+"""index hot board queries, one ride per user per event
+
+Revision ID: 7d2a4c6e8f10
+Revises: 3c8e1f2a9b47
+Create Date: 2026-10-18 11:02:47.120394
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2a4c6e8f10'
+down_revision = '3c8e1f2a9b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Denormalize the event onto riders so one ride per user per event can be a constraint.
+    op.add_column('riders', sa.Column('event_id', sa.Integer(), nullable=True))
+    op.execute("UPDATE riders SET event_id = (SELECT cars.event_id FROM cars WHERE cars.id = riders.car_id)")
+
+    # Drop duplicate rides left behind by racing joins, then recount the seats they held.
+    op.execute("DELETE FROM riders WHERE id NOT IN "
+               "(SELECT keep.id FROM (SELECT MIN(id) AS id FROM riders GROUP BY event_id, username) AS keep)")
+    op.execute("UPDATE cars SET current_capacity = "
+               "(SELECT COUNT(*) FROM riders WHERE riders.car_id = cars.id)")
+
+    with op.batch_alter_table('riders') as batch_op:
+        batch_op.alter_column('event_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('riders_event_id_fkey', 'events', ['event_id'], ['id'])
+        batch_op.create_unique_constraint('uq_riders_event_id_username', ['event_id', 'username'])
+
+    op.create_index('ix_riders_car_id', 'riders', ['car_id'], unique=False)
+    op.create_index('ix_riders_username_car_id', 'riders', ['username', 'car_id'], unique=False)
+    op.create_index('ix_cars_event_id_name', 'cars', ['event_id', 'name'], unique=False)
+    op.create_index('ix_cars_username_event_id', 'cars', ['username', 'event_id'], unique=False)
+    op.create_index('ix_events_expired_start_time', 'events', ['expired', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_events_expired_start_time', table_name='events')
+    op.drop_index('ix_cars_username_event_id', table_name='cars')
+    op.drop_index('ix_cars_event_id_name', table_name='cars')
+    op.drop_index('ix_riders_username_car_id', table_name='riders')
+    op.drop_index('ix_riders_car_id', table_name='riders')
+    with op.batch_alter_table('riders') as batch_op:
+        batch_op.drop_constraint('uq_riders_event_id_username', type_='unique')
+        batch_op.drop_constraint('riders_event_id_fkey', type_='foreignkey')
+        batch_op.drop_column('event_id')
@@ -0,0 +1,23 @@
+"""index events for keyset-paginated history
+
+Revision ID: 9a3f5b7c1d24
+Revises: 7d2a4c6e8f10
+Create Date: 2026-10-18 12:20:31.775902
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9a3f5b7c1d24'
+down_revision = '7d2a4c6e8f10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_events_start_time_id', 'events', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_events_start_time_id', table_name='events')
@@ -0,0 +1,40 @@
+"""full-text search index over event names and addresses
+
+Revision ID: a3c5e7f9b1d4
+Revises: f1a3c5e7b9d2
+Create Date: 2026-10-18 20:14:37.905126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e7f9b1d4'
+down_revision = 'f1a3c5e7b9d2'
+branch_labels = None
+depends_on = None
+
+DOCUMENT = ("setweight(to_tsvector('english', name), 'A') || "
+            "setweight(to_tsvector('english', address), 'B')")
+
+
+def upgrade():
+    # A tsvector with a GIN index on Postgres, an FTS5 table keyed by event id on SQLite.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_table('event_search',
+                        sa.Column('event_id', sa.Integer(), nullable=False),
+                        sa.Column('document', postgresql.TSVECTOR(), nullable=False),
+                        sa.PrimaryKeyConstraint('event_id'))
+        op.create_index('ix_event_search_document', 'event_search', ['document'], postgresql_using='gin')
+        op.execute(f"INSERT INTO event_search (event_id, document) "
+                   f"SELECT id, {DOCUMENT} FROM events UNION ALL SELECT id, {DOCUMENT} FROM events_archive")
+    else:
+        op.execute("CREATE VIRTUAL TABLE event_search USING fts5(name, address, tokenize='porter unicode61')")
+        op.execute("INSERT INTO event_search (rowid, name, address) "
+                   "SELECT id, name, address FROM events UNION ALL SELECT id, name, address FROM events_archive")
+
+
+def downgrade():
+    op.execute("DROP TABLE event_search")
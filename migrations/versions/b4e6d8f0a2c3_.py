@@ -0,0 +1,29 @@
+"""add board_state version counter
+
+Revision ID: b4e6d8f0a2c3
+Revises: 9a3f5b7c1d24
+Create Date: 2026-10-18 13:41:09.203117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e6d8f0a2c3'
+down_revision = '9a3f5b7c1d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    board_state = op.create_table('board_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(board_state, [{'id': 1, 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('board_state')
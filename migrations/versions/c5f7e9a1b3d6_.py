@@ -0,0 +1,32 @@
+"""add board_changes for live updates
+
+Revision ID: c5f7e9a1b3d6
+Revises: b4e6d8f0a2c3
+Create Date: 2026-10-18 14:58:36.512840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f7e9a1b3d6'
+down_revision = 'b4e6d8f0a2c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('board_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_board_changes_created_at'), 'board_changes', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_board_changes_created_at'), table_name='board_changes')
+    op.drop_table('board_changes')
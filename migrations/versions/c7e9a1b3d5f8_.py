@@ -0,0 +1,28 @@
+"""keep events' versions in the archive
+
+Revision ID: c7e9a1b3d5f8
+Revises: b5d7f9a1c3e6
+Create Date: 2026-10-19 10:14:27.603915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e9a1b3d5f8'
+down_revision = 'b5d7f9a1c3e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('events_archive', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+    # The versions of events archived so far are lost. No event's version is ever ahead of the board's, so
+    # restoring them at the board's version keeps them clear of every card cached before.
+    op.execute("UPDATE events_archive SET version = (SELECT COALESCE(MAX(version), 0) FROM board_state)")
+
+
+def downgrade():
+    with op.batch_alter_table('events_archive') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,24 @@
+"""add events.version for cached event cards
+
+Revision ID: d6a8c0e2f4b5
+Revises: c5f7e9a1b3d6
+Create Date: 2026-10-18 16:07:52.931466
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6a8c0e2f4b5'
+down_revision = 'c5f7e9a1b3d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('events', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('events', 'version')
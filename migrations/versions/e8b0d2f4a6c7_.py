@@ -0,0 +1,43 @@
+"""cascade deletes from events to cars and riders, and from cars to riders
+
+Revision ID: e8b0d2f4a6c7
+Revises: d6a8c0e2f4b5
+Create Date: 2026-10-18 17:21:09.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b0d2f4a6c7'
+down_revision = 'd6a8c0e2f4b5'
+branch_labels = None
+depends_on = None
+
+# cars.event_id and riders.car_id were created without names. This matches
+# Postgres' generated names, and gives SQLite's reflected keys the same ones.
+NAMING = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+FOREIGN_KEYS = [
+    ('cars', 'cars_event_id_fkey', 'events', 'event_id'),
+    ('riders', 'riders_car_id_fkey', 'cars', 'car_id'),
+    ('riders', 'riders_event_id_fkey', 'events', 'event_id'),
+]
+
+
+def recreate_foreign_keys(ondelete):
+    for table in ('cars', 'riders'):
+        with op.batch_alter_table(table, naming_convention=NAMING) as batch_op:
+            for fk_table, name, referent, column in FOREIGN_KEYS:
+                if fk_table == table:
+                    batch_op.drop_constraint(name, type_='foreignkey')
+                    batch_op.create_foreign_key(name, referent, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    recreate_foreign_keys('CASCADE')
+
+
+def downgrade():
+    recreate_foreign_keys(None)
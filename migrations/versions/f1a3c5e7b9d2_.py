@@ -0,0 +1,78 @@
+"""archive tables for expired events, cars and riders
+
+Revision ID: f1a3c5e7b9d2
+Revises: e8b0d2f4a6c7
+Create Date: 2026-10-18 19:02:44.318520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a3c5e7b9d2'
+down_revision = 'e8b0d2f4a6c7'
+branch_labels = None
+depends_on = None
+
+NAMING = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def set_sqlite_autoincrement(enabled):
+    # Archived rows keep their ids, so SQLite must not reuse the ids of deleted rows.
+    # Postgres sequences never do, and have nothing to change.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in ('events', 'cars', 'riders'):
+        with op.batch_alter_table(table, recreate='always', naming_convention=NAMING,
+                                  table_kwargs={'sqlite_autoincrement': enabled}):
+            pass
+
+
+def upgrade():
+    set_sqlite_autoincrement(True)
+    op.create_table('events_archive',
+                    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('name', sa.String(length=150), nullable=False),
+                    sa.Column('address', sa.Text(), nullable=False),
+                    sa.Column('start_time', sa.DateTime(), nullable=False),
+                    sa.Column('end_time', sa.DateTime(), nullable=False),
+                    sa.Column('creator', sa.String(length=50), nullable=False),
+                    sa.Column('archived_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_events_archive_start_time_id', 'events_archive', ['start_time', 'id'])
+    op.create_table('cars_archive',
+                    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('username', sa.String(length=80), nullable=False),
+                    sa.Column('name', sa.String(length=50), nullable=False),
+                    sa.Column('current_capacity', sa.Integer(), nullable=False),
+                    sa.Column('max_capacity', sa.Integer(), nullable=False),
+                    sa.Column('departure_time', sa.DateTime(), nullable=False),
+                    sa.Column('return_time', sa.DateTime(), nullable=False),
+                    sa.Column('driver_comment', sa.Text(), nullable=True),
+                    sa.Column('event_id', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['event_id'], ['events_archive.id'], name='cars_archive_event_id_fkey',
+                                            ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_cars_archive_event_id', 'cars_archive', ['event_id'])
+    op.create_table('riders_archive',
+                    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('username', sa.String(length=80), nullable=False),
+                    sa.Column('name', sa.String(length=50), nullable=False),
+                    sa.Column('car_id', sa.Integer(), nullable=False),
+                    sa.Column('event_id', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['car_id'], ['cars_archive.id'], name='riders_archive_car_id_fkey',
+                                            ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_riders_archive_car_id', 'riders_archive', ['car_id'])
+
+
+def downgrade():
+    # Archived events are dropped, not restored; run this only with an empty archive.
+    op.drop_index('ix_riders_archive_car_id', table_name='riders_archive')
+    op.drop_table('riders_archive')
+    op.drop_index('ix_cars_archive_event_id', table_name='cars_archive')
+    op.drop_table('cars_archive')
+    op.drop_index('ix_events_archive_start_time_id', table_name='events_archive')
+    op.drop_table('events_archive')
+    set_sqlite_autoincrement(False)
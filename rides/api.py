@@ -0,0 +1,65 @@
+from flask import Blueprint, abort, jsonify
+from flask_login import login_required
+
+from rides.caching import conditional
+from rides.database import read_replica
+from rides.models import Event, BoardState
+
+# Read-only JSON view of the board. Every response carries an ETag built
+# from the board version, so pollers sending If-None-Match get a 304 for the
+# price of one small query whenever nothing has changed.
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def _rider_json(rider):
+    return {
+        "id": rider.id,
+        "username": rider.username,
+        "name": rider.name
+    }
+
+
+def _car_json(car):
+    return {
+        "id": car.id,
+        "username": car.username,
+        "name": car.name,
+        "current_capacity": car.current_capacity,
+        "max_capacity": car.max_capacity,
+        "departure_time": car.departure_time.isoformat(),
+        "return_time": car.return_time.isoformat(),
+        "driver_comment": car.driver_comment,
+        "riders": [_rider_json(rider) for rider in car.riders]
+    }
+
+
+def _event_json(event):
+    return {
+        "id": event.id,
+        "name": event.name,
+        "address": event.address,
+        "start_time": event.start_time.isoformat(),
+        "end_time": event.end_time.isoformat(),
+        "creator": event.creator,
+        "cars": [_car_json(car) for car in event.cars]
+    }
+
+
+@bp.route('/events')
+@login_required
+@read_replica
+def api_events():
+    return conditional(lambda now: jsonify(events=[_event_json(event) for event in Event.board(now)]),
+                       etag=BoardState.tag)
+
+
+@bp.route('/events/<int:event_id>')
+@login_required
+@read_replica
+def api_event(event_id):
+    def build(now):
+        event = Event.board(now).filter(Event.id == event_id).first()
+        if event is None:
+            abort(404)
+        return jsonify(_event_json(event))
+    return conditional(build, etag=BoardState.tag)
@@ -0,0 +1,261 @@
+import base64
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import urllib.parse
+from collections import namedtuple
+
+import click
+import requests
+from flask import Blueprint, current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Front-end libraries, self-hosted. `flask build-assets --fetch` downloads them
+# into static/vendor (checking the published SRI hashes) together with the
+# fonts their CSS refers to. `flask build-assets` concatenates each bundle,
+# names it by content hash and writes gzip and brotli copies next to it in
+# static/dist, with a manifest that asset_urls() resolves names through. The
+# bundles are served from /assets with immutable cache headers, since a change
+# always produces a new file name.
+bp = Blueprint('assets', __name__)
+
+Source = namedtuple('Source', ['path', 'url', 'integrity'])
+Asset = namedtuple('Asset', ['url', 'integrity'])
+
+BUNDLES = {
+    'app.js': [
+        Source('jquery/3.3.1/jquery.min.js', 'https://code.jquery.com/jquery-3.3.1.min.js',
+               'sha256-FgpCb/KJQlLNfOu91ta32o/NMZxltwRo8QtmkMRdAu8='),
+        Source('popper.js/1.12.9/umd/popper.min.js',
+               'https://cdnjs.cloudflare.com/ajax/libs/popper.js/1.12.9/umd/popper.min.js',
+               'sha384-ApNbgh9B+Y1QKtv3Rn7W3mgPxhU9K/ScQsAP7hUibX39j7fakFPskvXusvfa0b4Q'),
+        Source('bootstrap/4.0.0/js/bootstrap.min.js',
+               'https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0/js/bootstrap.min.js',
+               'sha384-JZR6Spejh4U02d8jOt6vLEHfe/JQGiRRSQQxSfFWpi1MquVdAyjUar5+76PVCmYl'),
+        Source('moment.js/2.22.2/moment.min.js',
+               'https://cdnjs.cloudflare.com/ajax/libs/moment.js/2.22.2/moment.min.js', None),
+        Source('tempusdominus-bootstrap-4/5.0.0/js/tempusdominus-bootstrap-4.min.js',
+               'https://cdnjs.cloudflare.com/ajax/libs/tempusdominus-bootstrap-4/5.0.0/js/'
+               'tempusdominus-bootstrap-4.min.js', None),
+    ],
+    'app.css': [
+        Source('tempusdominus-bootstrap-4/5.0.0/css/tempusdominus-bootstrap-4.min.css',
+               'https://cdnjs.cloudflare.com/ajax/libs/tempusdominus-bootstrap-4/5.0.0/css/'
+               'tempusdominus-bootstrap-4.min.css', None),
+        Source('fontawesome/5.0.13/css/all.css', 'https://use.fontawesome.com/releases/v5.0.13/css/all.css',
+               'sha384-DNOHZ68U8hZfKXOrtjWvjxusGo9WQnrNx2sqG0tfsghAvtVlRW3tvkXWZh58N9jp'),
+    ]
+}
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+SOURCE_MAP = re.compile(r'^\s*(//[#@] sourceMappingURL=.*|/\*[#@] sourceMappingURL=.*\*/)\s*$', re.MULTILINE)
+
+MANIFEST = 'assets.json'
+
+_manifests = {}
+
+
+def vendor_dir(app):
+    return os.path.join(app.static_folder, 'vendor')
+
+
+def dist_dir(app):
+    return os.path.join(app.static_folder, 'dist')
+
+
+def init_app(app):
+    app.add_template_global(asset_urls)
+    app.cli.add_command(build_assets_command)
+    app.register_blueprint(bp)
+
+
+def asset_urls(name):
+    """
+    The Assets to include for bundle `name`: the bundle itself once built,
+    otherwise its libraries from their CDNs so pages keep working in a fresh
+    checkout.
+    """
+    entry = _manifest(current_app).get(name)
+    if entry is not None:
+        return [Asset(url_for('assets.asset', filename=entry['file']), entry['integrity'])]
+    return [Asset(source.url, source.integrity) for source in BUNDLES[name]]
+
+
+def _manifest(app):
+    path = os.path.join(dist_dir(app), MANIFEST)
+    if path not in _manifests or app.debug:
+        try:
+            with open(path, encoding='utf-8') as f:
+                _manifests[path] = json.load(f)
+        except (OSError, ValueError):
+            _manifests[path] = {}
+    return _manifests[path]
+
+
+@bp.route('/assets/<path:filename>')
+def asset(filename):
+    directory = dist_dir(current_app)
+    response = None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(directory, filename + suffix)):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(directory, filename)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@click.command('build-assets')
+@click.option('--fetch', is_flag=True, help='Download libraries missing from static/vendor first.')
+@with_appcontext
+def build_assets_command(fetch):
+    """Bundle, fingerprint and compress the front-end libraries."""
+    _build_assets(vendor_dir(current_app), dist_dir(current_app), fetch)
+
+
+@click.command()
+@click.option('--fetch', is_flag=True, help='Download libraries missing from static/vendor first.')
+def main(fetch):
+    """
+    Build the bundles without creating the app, so no config or database is
+    needed (as when building the Docker image): python -m rides.assets --fetch
+    """
+    static = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    _build_assets(os.path.join(static, 'vendor'), os.path.join(static, 'dist'), fetch)
+
+
+def _build_assets(vendor, dist, fetch):
+    if fetch:
+        fetch_sources(vendor)
+    manifest = build(vendor, dist)
+    _manifests.clear()
+    for name, entry in manifest.items():
+        print(f"{name} -> {entry['file']}")
+
+
+def fetch_sources(vendor):
+    """Download every library not in `vendor` yet, plus the files its CSS refers to."""
+    with requests.Session() as session:
+        for sources in BUNDLES.values():
+            for source in sources:
+                path = os.path.join(vendor, source.path)
+                if not os.path.exists(path):
+                    _download(session, source.url, path, source.integrity)
+                if path.endswith('.css'):
+                    with open(path, encoding='utf-8') as f:
+                        css = f.read()
+                    for ref in _local_refs(css):
+                        target = os.path.normpath(os.path.join(os.path.dirname(path), ref))
+                        if not os.path.exists(target):
+                            _download(session, urllib.parse.urljoin(source.url, ref), target, None)
+
+
+def _download(session, url, path, integrity):
+    print(f"Fetching {url}")
+    response = session.get(url, timeout=30)
+    response.raise_for_status()
+    if integrity is not None and _integrity(response.content, integrity.split('-')[0]) != integrity:
+        raise click.ClickException(f"{url} does not match its integrity hash {integrity}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(response.content)
+
+
+def _local_refs(css):
+    # Files referred to by url(...), without any ?query or #fragment.
+    refs = set()
+    for match in CSS_URL.finditer(css):
+        ref = match.group(2)
+        if not ref.startswith(('data:', 'http:', 'https:', '/')):
+            refs.add(re.split('[?#]', ref)[0])
+    return refs
+
+
+def _integrity(content, algorithm='sha384'):
+    return f"{algorithm}-{base64.b64encode(hashlib.new(algorithm, content).digest()).decode()}"
+
+
+def _fingerprint(content, name):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def build(vendor, dist):
+    """Write every bundle, and the files they refer to, to `dist`. Returns the new manifest."""
+    staging = dist + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            path = os.path.join(vendor, source.path)
+            if not os.path.exists(path):
+                raise click.ClickException(f"{path} is missing; run flask build-assets --fetch")
+            with open(path, encoding='utf-8') as f:
+                text = SOURCE_MAP.sub('', f.read())
+            if name.endswith('.css'):
+                text = _minify_css(_copy_css_refs(text, os.path.dirname(path), staging))
+            parts.append(text.strip())
+        # The semicolon keeps a library without a trailing one from running into the next.
+        content = ('\n;\n' if name.endswith('.js') else '\n').join(parts).encode('utf-8') + b'\n'
+        file_name = _fingerprint(content, name)
+        _write(os.path.join(staging, file_name), content)
+        manifest[name] = {'file': file_name, 'integrity': _integrity(content)}
+    with open(os.path.join(staging, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    # Swap the whole directory so a running app never sees a half-written build.
+    shutil.rmtree(dist, ignore_errors=True)
+    os.rename(staging, dist)
+    return manifest
+
+
+def _minify_css(css):
+    # The libraries ship minified JavaScript, but Font Awesome's CSS is not.
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{};])\s*', r'\1', css)
+
+
+def _copy_css_refs(css, directory, staging):
+    # Fonts and images move next to the bundle under fingerprinted names.
+    def replace(match):
+        ref = match.group(2)
+        if ref.startswith(('data:', 'http:', 'https:', '/')):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', ref).groups()
+        with open(os.path.normpath(os.path.join(directory, path)), 'rb') as f:
+            content = f.read()
+        file_name = _fingerprint(content, os.path.basename(path))
+        _write(os.path.join(staging, file_name), content)
+        return f'url({file_name}{suffix})'
+    return CSS_URL.sub(replace, css)
+
+
+def _write(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+    # Fonts are compressed already; text is worth precompressing.
+    if not path.endswith(('.js', '.css', '.svg', '.ttf', '.eot')):
+        return
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(content, 9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(content))
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Small caches with a common interface, so a backend can be picked from config.
+# Values must be JSON-serializable for backends shared between processes.
+
+
+class Cache:
+    """Base class keeping hit and miss counters. Subclasses implement _get/_set/_delete."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._set(key, value)
+
+    def delete(self, key):
+        self._delete(key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value):
+        raise NotImplementedError
+
+    def _delete(self, key):
+        raise NotImplementedError
+
+
+class NullCache(Cache):
+    """Caches nothing."""
+
+    def _get(self, key):
+        return None
+
+    def _set(self, key, value):
+        pass
+
+    def _delete(self, key):
+        pass
+
+
+class LRUCache(Cache):
+    """
+    In-process cache holding at most `maxsize` entries, least recently used
+    evicted first. Entries also expire `ttl` seconds after being set, if given.
+    """
+
+    def __init__(self, maxsize=512, ttl=None):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key, value):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class FileSystemCache(Cache):
+    """
+    Cache stored as JSON files in a directory, shared by every worker on the
+    host. Holds roughly `maxsize` entries; the oldest files go first.
+    """
+
+    def __init__(self, directory, maxsize=512):
+        super().__init__()
+        self.directory = directory
+        self.maxsize = maxsize
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + ".json")
+
+    def _get(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _set(self, key, value):
+        # Write to a temporary file and rename it so readers never see half an entry.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp, self._path(key))
+        self._prune()
+
+    def _delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _prune(self):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+        if len(entries) <= self.maxsize:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.maxsize]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def make_cache(backend, size, directory=None):
+    """Build a cache from config values: backend is "lru", "filesystem" or "none"."""
+    if backend == "lru":
+        return LRUCache(int(size))
+    if backend == "filesystem":
+        return FileSystemCache(directory, int(size))
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown cache backend {backend!r}")
@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import time
+
+from flask import current_app, request
+from flask_login import current_user
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from rides import git_commit, local_now
+from rides.models import BoardState
+
+# HTTP caching policy and response compression for dynamic pages.
+#
+# Pages are personalized, so by default they may only be cached by the
+# browser, and must be revalidated (private, no-cache). The board and history
+# pages answer revalidation from their ETag alone, which is built from the
+# board version and the user, so an unchanged page costs one small query and
+# a 304. Static files are public. Larger HTML, JSON and text responses are
+# compressed with brotli or gzip, whichever the client prefers.
+
+COMPRESSIBLE = {'text/html', 'application/json', 'text/plain', 'text/css', 'application/javascript', 'text/csv',
+                'text/calendar', 'application/x-ndjson'}
+
+# Middle settings: on repetitive markup they get most of the way to the
+# maximum compression at a fraction of the CPU time.
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+
+def init_app(app):
+    # after_request functions run in reverse, so compression sees the final headers.
+    app.after_request(_compress)
+    app.after_request(_cache_policy)
+
+
+def page_etag(now):
+    """
+    ETag for a page built from the board for the current user. The CSRF
+    tokens in the page expire, so it also changes at half their lifetime.
+    """
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    window = int(time.time() // (limit / 2)) if limit else 0
+    # The navigation bar shows the user's name and picture, and a deploy can change any template.
+    user = f"{current_user.id}:{current_user.firstname}:{current_user.lastname}:{current_user.picture}"
+    commit = current_app.config.get('RIDEBOARD_COMMIT') or git_commit()
+    return hashlib.sha1(f"{BoardState.tag(now)}:{user}:{commit}:{window}".encode()).hexdigest()
+
+
+def conditional(build, etag=None):
+    """
+    Answer If-None-Match from the board version alone, calling build(now)
+    only when the client does not have this version. `etag` defaults to
+    page_etag; responses are private and always revalidated.
+    """
+    now = local_now()
+    etag = etag(now) if etag is not None else page_etag(now)
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.make_response(build(now))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+
+def _cache_policy(response):
+    if 'Cache-Control' in response.headers:
+        return response
+    if request.endpoint == 'static':
+        response.cache_control.public = True
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+    return response
+
+
+def _compressible(response):
+    # Streamed responses (live updates, files) are left alone, as are empty and already encoded ones.
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return False
+    return 200 <= response.status_code and response.status_code not in (204, 304) \
+        and response.mimetype in COMPRESSIBLE
+
+
+def _compress(response):
+    if not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < int(current_app.config['COMPRESS_MIN_SIZE']):
+        return response
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br'] and accepted['br'] >= accepted['gzip']:
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    # The compressed body is a different representation of the same resource.
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
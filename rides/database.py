@@ -0,0 +1,82 @@
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+# Engine settings and read replica routing. Every engine gets a pool sized for
+# one worker's threads (SQLite keeps its own pooling), recycles connections
+# before the server would drop them and pings them on checkout. When
+# SQLALCHEMY_REPLICA_URI is set, the views marked with read_replica send their
+# queries to the "replica" bind and everything else goes to the primary. A
+# user who has just written reads from the primary for REPLICA_STICKY_SECONDS,
+# so they see their own change even if the replica is behind.
+
+
+def engine_options(url, config):
+    """Pool options for an engine connecting to `url`."""
+    options = {
+        'pool_pre_ping': config['SQLALCHEMY_POOL_PRE_PING'],
+        'pool_recycle': int(config['SQLALCHEMY_POOL_RECYCLE'])
+    }
+    # SQLite files and in-memory databases use pools without a size.
+    if make_url(url).get_backend_name() != 'sqlite':
+        options['pool_size'] = int(config['SQLALCHEMY_POOL_SIZE'])
+        options['max_overflow'] = int(config['SQLALCHEMY_MAX_OVERFLOW'])
+    return options
+
+
+def configure(app):
+    """Fill in the engine options and the replica bind. Call before db.init_app(app)."""
+    primary = app.config.get('SQLALCHEMY_DATABASE_URI')
+    if primary:
+        # Options set explicitly in the config win.
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**engine_options(primary, app.config),
+                                                   **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    replica = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if replica:
+        app.config['SQLALCHEMY_BINDS'] = {**app.config.get('SQLALCHEMY_BINDS', {}),
+                                          'replica': {'url': replica, **engine_options(replica, app.config)}}
+
+
+def init_app(app):
+    app.after_request(_remember_writes)
+
+
+class RoutingSession(Session):
+    """
+    Sends queries to the replica during views marked with read_replica, and
+    writes, along with anything after a write, to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.info['wrote'] = True
+            elif self._use_replica():
+                return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self):
+        return (not self.info.get('wrote') and has_app_context() and g.get('read_replica', False)
+                and 'replica' in self._db.engines)
+
+
+def read_replica(view):
+    """Let `view` read from the replica, unless the user wrote recently."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if session.get('primary_until', 0) < time.time():
+            g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _remember_writes(response):
+    # Imported here as rides imports this module to build db.
+    from rides import db  # pylint: disable=import-outside-toplevel
+    if db.session.registry.has() and db.session.info.get('wrote') and 'replica' in db.engines:
+        session['primary_until'] = time.time() + float(current_app.config['REPLICA_STICKY_SECONDS'])
+    return response
@@ -0,0 +1,112 @@
+import csv
+import datetime
+import io
+import json
+
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+from flask_login import current_user, login_required
+from sqlalchemy import and_, or_, select, union_all
+
+from rides import db
+from rides.database import read_replica
+from rides.models import ArchivedCar, ArchivedEvent, ArchivedRider, Car, Event, Rider
+
+# Bulk export of every event, car and rider, live and archived, for admins
+# (the ADMINS config). One row per rider, or per car without riders. The rows
+# come off a server-side cursor a batch at a time and are written out as they
+# arrive, so memory use does not grow with the size of the tables.
+bp = Blueprint('export', __name__)
+
+COLUMNS = ('event_id', 'event_name', 'address', 'start_time', 'end_time', 'creator', 'car_id', 'driver',
+           'driver_name', 'departure_time', 'return_time', 'current_capacity', 'max_capacity', 'rider',
+           'rider_name')
+
+# Rows fetched from the cursor at a time.
+BATCH_SIZE = 1000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+def is_admin(user):
+    admins = {name.strip() for name in current_app.config['ADMINS'].split(',')}
+    return user.is_authenticated and user.id in admins
+
+
+def init_app(app):
+    app.add_template_global(is_admin)
+    app.register_blueprint(bp)
+
+
+@bp.route('/admin/export.<any(csv, ndjson):fmt>')
+@login_required
+@read_replica
+def export(fmt):
+    if not is_admin(current_user):
+        abort(403)
+    try:
+        start = _date(request.args.get('from'))
+        end = _date(request.args.get('to'))
+    except ValueError:
+        abort(400)
+    user = request.args.get('user') or None
+    # The date range is inclusive of the whole of its last day.
+    rows = _rows(start, end + datetime.timedelta(days=1) if end else None, user)
+    writer = _csv if fmt == 'csv' else _ndjson
+    response = Response(stream_with_context(writer(rows)), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="rideboard-export.{fmt}"'
+    return response
+
+
+def _date(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d') if value else None
+
+
+def _select(event, car, rider, start, end, user):
+    columns = (event.id, event.name, event.address, event.start_time, event.end_time, event.creator, car.id,
+               car.username, car.name, car.departure_time, car.return_time, car.current_capacity, car.max_capacity,
+               rider.username, rider.name)
+    query = select(*(column.label(name) for column, name in zip(columns, COLUMNS)))\
+        .select_from(event).outerjoin(car, car.event_id == event.id).outerjoin(rider, rider.car_id == car.id)
+    conditions = []
+    if start is not None:
+        conditions.append(event.start_time >= start)
+    if end is not None:
+        conditions.append(event.start_time < end)
+    if user is not None:
+        conditions.append(or_(event.creator == user, car.username == user, rider.username == user))
+    return query.where(and_(*conditions)) if conditions else query
+
+
+def _rows(start, end, user):
+    live = _select(Event, Car, Rider, start, end, user)
+    archived = _select(ArchivedEvent, ArchivedCar, ArchivedRider, start, end, user)
+    query = union_all(live, archived).order_by('start_time', 'event_id', 'car_id', 'rider')
+    # yield_per streams the results: a server-side cursor on Postgres, fetched BATCH_SIZE rows at a time.
+    yield from db.session.execute(query.execution_options(yield_per=BATCH_SIZE))
+
+
+def _csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        # Hand the output over in chunks of about 8 KB rather than row by row.
+        if buffer.tell() > 8192:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(COLUMNS, row)), default=datetime.datetime.isoformat) + '\n')
+        if len(lines) >= 100:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
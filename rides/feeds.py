@@ -0,0 +1,166 @@
+import datetime
+import hashlib
+import os
+
+import pytz
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context, url_for
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import or_, select
+from sqlalchemy.orm import contains_eager, selectinload
+
+from rides import eastern, local_now
+from rides.cache import make_cache
+from rides.caching import conditional
+from rides.database import read_replica
+from rides.models import BoardState, Car, Event, Rider
+
+# iCalendar feeds of the upcoming events and of the rides a user drives or
+# rides in. Calendar clients cannot log in, so each user gets feed URLs with
+# a signed token naming them. Clients poll often, so a feed is generated once
+# per board version: the ETag and the cache key both come from BoardState.tag,
+# a poll of an unchanged board costs that one small query, and only the first
+# poll after a change streams a freshly generated feed out.
+bp = Blueprint('feeds', __name__)
+
+ICS = 'text/calendar'
+
+
+def init_app(app):
+    app.extensions["calendar_cache"] = make_cache(app.config["FRAGMENT_CACHE"], app.config["FRAGMENT_CACHE_SIZE"],
+                                                  os.path.join(app.config["FRAGMENT_CACHE_DIR"], "calendar"))
+    app.add_template_global(calendar_url)
+    app.register_blueprint(bp)
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.secret_key, salt='calendar')
+
+
+def calendar_url(feed, username):
+    """The URL calendar clients subscribe to for `username`'s `feed`."""
+    return url_for('feeds.calendar_feed', token=_serializer().dumps(username), feed=feed, _external=True)
+
+
+@bp.route('/calendar/<token>/<any(events, rides):feed>.ics')
+@read_replica
+def calendar_feed(token, feed):
+    try:
+        username = _serializer().loads(token)
+    except BadSignature:
+        abort(404)
+    now = local_now()
+    key = hashlib.sha1(f"{feed}:{username}:{BoardState.tag(now)}".encode()).hexdigest()
+
+    def build(_now):
+        cached = current_app.extensions["calendar_cache"].get(key)
+        if cached is not None:
+            return Response(cached, mimetype=ICS)
+        entries = _events(now) if feed == 'events' else _rides(now, username)
+        return Response(stream_with_context(_stream(key, entries)), mimetype=ICS)
+    return conditional(build, etag=lambda _now: key)
+
+
+def _stream(key, entries):
+    # Send the feed as it is generated, and keep a copy for the next poll.
+    parts = []
+    for part in _calendar(entries):
+        parts.append(part)
+        yield part
+    current_app.extensions["calendar_cache"].set(key, "".join(parts))
+
+
+def _events(now):
+    for event in Event.board(now):
+        cars = [car for car in event.cars if car.max_capacity]
+        description = [f"Hosted by {event.creator}."]
+        description += [f"{car.name}: {car.current_capacity}/{car.max_capacity} seats, leaves "
+                        f"{car.departure_time:%B %d at %H:%M}" for car in cars]
+        yield {
+            'UID': f"event-{event.id}",
+            'DTSTART': event.start_time,
+            'DTEND': event.end_time,
+            'SUMMARY': event.name,
+            'LOCATION': event.address,
+            'DESCRIPTION': "\n".join(description)
+        }
+
+
+def _rides(now, username):
+    riding = select(Rider.car_id).where(Rider.username == username)
+    cars = Car.query.join(Event, Car.event_id == Event.id)\
+        .filter(Event.live(now), or_(Car.username == username, Car.id.in_(riding)))\
+        .options(contains_eager(Car.events), selectinload(Car.riders))\
+        .order_by(Car.departure_time)
+    for car in cars:
+        event = car.events
+        if car.max_capacity == 0:
+            summary = f"Need a ride to {event.name}"
+        elif car.username == username:
+            summary = f"Driving to {event.name}"
+        else:
+            summary = f"Ride to {event.name} with {car.name}"
+        description = [f"Riders: {', '.join(rider.name for rider in car.riders) or 'none yet'}"]
+        if car.driver_comment:
+            description.append(car.driver_comment)
+        yield {
+            'UID': f"car-{car.id}",
+            'DTSTART': car.departure_time,
+            'DTEND': car.return_time,
+            'SUMMARY': summary,
+            'LOCATION': event.address,
+            'DESCRIPTION': "\n".join(description)
+        }
+
+
+def _calendar(entries):
+    yield _lines(["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Computer Science House//Rideboard//EN",
+                  "CALSCALE:GREGORIAN", "METHOD:PUBLISH", "X-WR-CALNAME:Rideboard"])
+    stamp = _utc(datetime.datetime.utcnow(), pytz.utc)
+    host = request.host.split(':')[0]
+    url = url_for('rides.index', _external=True)
+    for entry in entries:
+        yield _lines([
+            "BEGIN:VEVENT",
+            f"UID:{entry['UID']}@{host}",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{_utc(entry['DTSTART'])}",
+            f"DTEND:{_utc(entry['DTEND'])}",
+            f"SUMMARY:{_escape(entry['SUMMARY'])}",
+            f"LOCATION:{_escape(entry['LOCATION'])}",
+            f"DESCRIPTION:{_escape(entry['DESCRIPTION'])}",
+            f"URL:{url}",
+            "END:VEVENT"
+        ])
+    yield _lines(["END:VCALENDAR"])
+
+
+def _utc(moment, zone=eastern):
+    # Times are stored as naive Eastern time.
+    return zone.localize(moment).astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n')\
+        .replace('\n', '\\n')
+
+
+def _lines(lines):
+    return "".join(_fold(line) + "\r\n" for line in lines)
+
+
+def _fold(line):
+    # Lines longer than 75 octets continue on the next line after a space (RFC 5545, 3.1).
+    encoded = line.encode('utf-8')
+    parts = []
+    limit = 75
+    while len(encoded) > limit:
+        cut = limit
+        # Never split a UTF-8 sequence.
+        while encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        # The leading space of a continuation line counts too.
+        limit = 74
+    parts.append(encoded.decode('utf-8'))
+    return "\r\n ".join(parts)
@@ -0,0 +1,57 @@
+from flask import current_app
+from markupsafe import Markup
+
+from rides.cache import make_cache
+
+# The shared parts of each board event card, rendered once per event version.
+# Every change to an event, its cars or its riders bumps Event.version (see
+# BoardState.bump), so a stale card is never looked up again and simply ages
+# out of the cache. Cards are shared by all users; index.html adds each user's
+# join/leave/edit controls around them. A cached card that does not have the
+# cars being rendered (it was cached from another snapshot of the event, such
+# as a lagging replica's, under the same version) is rendered again.
+
+
+def init_app(app):
+    app.extensions["card_cache"] = make_cache(app.config["FRAGMENT_CACHE"], app.config["FRAGMENT_CACHE_SIZE"],
+                                              app.config["FRAGMENT_CACHE_DIR"])
+    app.add_template_global(event_card)
+
+
+class EventCard:
+
+    def __init__(self, parts):
+        self._parts = parts
+
+    @property
+    def details(self):
+        return Markup(self._parts["details"])
+
+    def car_title(self, car):
+        return Markup(self._parts["cars"][str(car.id)]["title"])
+
+    def car_table(self, car):
+        return Markup(self._parts["cars"][str(car.id)]["table"])
+
+
+def event_card(event):
+    card_cache = current_app.extensions["card_cache"]
+    key = f"card:{event.id}:{event.version}"
+    parts = card_cache.get(key)
+    if parts is None or not all(str(car.id) in parts["cars"] for car in event.cars):
+        parts = _render(event)
+        card_cache.set(key, parts)
+    return EventCard(parts)
+
+
+def _render(event):
+    macros = current_app.jinja_env.get_template("event_card.html").module
+    return {
+        "details": str(macros.details(event)),
+        "cars": {
+            str(car.id): {
+                "title": str(macros.car_title(car)),
+                "table": str(macros.car_table(car))
+            } for car in event.cars
+        }
+    }
@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from flask_login import login_required
+
+from rides import db
+from rides.models import BoardChange
+
+# Live board updates. Mutating routes publish small change events through a
+# broker and /stream relays them to browsers as Server-Sent Events:
+#   car   - a car's seat count or rider list changed; the page patches it in place.
+#   board - events or cars were added, edited or removed; the page offers a reload.
+bp = Blueprint('live', __name__)
+
+
+class MemoryBroker:
+    """
+    Fans changes out to the subscribers in this process only. Fine for a single
+    worker and for local testing.
+    """
+
+    def __init__(self, flask_app, backlog=1000):
+        self.app = flask_app
+        self._changes = deque(maxlen=backlog)
+        self._latest = 0
+        # Changes up to and including this id are no longer available.
+        self._floor = 0
+        self._cond = threading.Condition()
+
+    def publish(self, kind, data):
+        with self._cond:
+            self._append(self._latest + 1, kind, data)
+
+    def latest(self):
+        return self._latest
+
+    def wait(self, last_id, timeout):
+        """
+        Changes published after `last_id`, waiting up to `timeout` seconds for
+        one. Returns None if changes after `last_id` were already dropped from
+        the backlog.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._latest > last_id, timeout)
+            if last_id < self._floor:
+                return None
+            return [change for change in self._changes if change[0] > last_id]
+
+    def _append(self, change_id, kind, data):
+        with self._cond:
+            if len(self._changes) == self._changes.maxlen:
+                self._floor = self._changes[0][0]
+            self._changes.append((change_id, kind, data))
+            self._latest = change_id
+            self._cond.notify_all()
+
+
+class DatabaseBroker(MemoryBroker):
+    """
+    Stores changes in the board_changes table so that every gunicorn worker sees
+    them. One thread per worker polls the table and hands new rows to that
+    worker's subscribers.
+    """
+
+    def __init__(self, flask_app, backlog=1000):
+        super().__init__(flask_app, backlog)
+        self._poller = None
+        self._poller_pid = None
+        self._poller_lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def close(self):
+        """Stop polling, as when the app's database goes away."""
+        self._closed.set()
+
+    def publish(self, kind, data):
+        db.session.add(BoardChange(kind, json.dumps(data)))
+        db.session.commit()
+
+    def latest(self):
+        self._ensure_poller()
+        return self._latest
+
+    def wait(self, last_id, timeout):
+        self._ensure_poller()
+        return super().wait(last_id, timeout)
+
+    def _ensure_poller(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own.
+        with self._poller_lock:
+            if self._poller is not None and self._poller_pid == os.getpid() and self._poller.is_alive():
+                return
+            with self.app.app_context():
+                self._latest = self._floor = db.session.query(db.func.coalesce(db.func.max(BoardChange.id), 0))\
+                    .scalar()
+                db.session.remove()
+            self._poller = threading.Thread(target=self._poll, name="live-poller", daemon=True)
+            self._poller_pid = os.getpid()
+            self._poller.start()
+
+    def _poll(self):
+        interval = float(self.app.config["LIVE_POLL_INTERVAL"])
+        while not self._closed.wait(interval):
+            try:
+                with self.app.app_context():
+                    rows = BoardChange.query.filter(BoardChange.id > self._latest)\
+                        .order_by(BoardChange.id.asc()).limit(500).all()
+                    for row in rows:
+                        self._append(row.id, row.kind, json.loads(row.payload))
+                    db.session.remove()
+            except Exception as e:  # pylint: disable=broad-except
+                # Keep polling through database hiccups; subscribers just hear nothing meanwhile.
+                print("Error polling board changes")
+                print(e)
+
+
+BACKENDS = {
+    "memory": MemoryBroker,
+    "database": DatabaseBroker
+}
+
+_broker_lock = threading.Lock()
+
+
+def broker():
+    """The current app's broker, started on first use."""
+    app = current_app._get_current_object()  # pylint: disable=protected-access
+    with _broker_lock:
+        if "live_broker" not in app.extensions:
+            app.extensions["live_broker"] = BACKENDS[app.config["LIVE_BACKEND"]](app)
+        return app.extensions["live_broker"]
+
+
+def publish_car(car):
+    """Tell subscribers about a car's current seat count and riders."""
+    broker().publish("car", {
+        "car_id": car.id,
+        "event_id": car.event_id,
+        "current_capacity": car.current_capacity,
+        "max_capacity": car.max_capacity,
+        "riders": [rider.name for rider in car.riders]
+    })
+
+
+def publish_board(event_id=None):
+    """Tell subscribers the board changed in a way that needs a reload."""
+    broker().publish("board", {"event_id": event_id})
+
+
+@bp.route('/stream')
+@login_required
+def stream():
+    live = broker()
+    heartbeat = float(current_app.config["LIVE_HEARTBEAT"])
+    # Hand the connection back after a while; EventSource reconnects with Last-Event-ID.
+    deadline = time.monotonic() + float(current_app.config["LIVE_STREAM_SECONDS"])
+    try:
+        last_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_id = live.latest()
+
+    def events():
+        nonlocal last_id
+        yield "retry: 2000\n\n"
+        while time.monotonic() < deadline:
+            changes = live.wait(last_id, heartbeat)
+            if changes is None:
+                # Too far behind to catch up change by change.
+                last_id = live.latest()
+                yield f"id: {last_id}\nevent: board\ndata: {{}}\n\n"
+                continue
+            if not changes:
+                yield ": keepalive\n\n"
+                continue
+            for change_id, kind, data in changes:
+                last_id = change_id
+                yield f"id: {change_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,130 @@
+import datetime
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import bindparam, update
+
+from rides import db, local_now
+from rides.models import BoardState, Car, Event, Rider
+from rides.pings import send_join
+from rides.utils import user_string
+
+# Matching riders waiting in an event's Need a Ride pool to cars with free
+# seats. A car can take pool riders if it leaves by the time the event starts
+# and gets back once it ends, give or take MATCHING_SLACK_MINUTES. Riders are
+# seated in the order they joined the pool, and cars filled in the order they
+# were offered. Everything is planned in memory from two SELECTs and applied
+# with two executemany UPDATEs, so an event with hundreds of waiting riders
+# costs the same handful of statements as one with a single rider. Nothing is
+# committed here; callers commit the moves with the change that caused them.
+
+# The placeholder car every event is created with.
+POOL_USERNAME = '∞'
+
+Move = namedtuple('Move', ['rider_id', 'username', 'name', 'event_id', 'car_id', 'driver'])
+
+_riders = Rider.__table__
+_cars = Car.__table__
+
+
+def fits(car, pool, slack):
+    """Whether `car` gets riders to the event and back, within `slack`."""
+    return car.departure_time <= pool.departure_time + slack and car.return_time >= pool.return_time - slack
+
+
+def plan(pool, waiting, cars, slack):
+    """
+    The moves that seat `waiting`, the riders of the `pool` car in the order
+    they joined, in `cars`. Riders who drive in the event stay put.
+    """
+    drivers = {car.username for car in cars}
+    seats = iter([(car, car.max_capacity - car.current_capacity) for car in cars
+                  if car.max_capacity > 0 and fits(car, pool, slack)])
+    moves = []
+    car, free = next(seats, (None, 0))
+    for rider in waiting:
+        if rider.username in drivers:
+            continue
+        while car is not None and free <= 0:
+            car, free = next(seats, (None, 0))
+        if car is None:
+            break
+        free -= 1
+        moves.append(Move(rider.id, rider.username, rider.name, car.event_id, car.id, car.username))
+    return moves
+
+
+def match(event_ids=None):
+    """
+    Seat the riders waiting in Need a Ride in the given events, or in every
+    event on the board. The cars are locked until the caller commits. Returns
+    the moves made.
+    """
+    events = Event.query.filter(Event.live(local_now()))
+    if event_ids is not None:
+        events = events.filter(Event.id.in_(event_ids))
+    event_ids = [event_id for event_id, in events.with_entities(Event.id)]
+    if not event_ids:
+        return []
+    # Overwrite anything stale in the session: seats may have moved since these cars were loaded.
+    cars = Car.query.filter(Car.event_id.in_(event_ids)).order_by(Car.event_id, Car.id)\
+        .with_for_update().populate_existing().all()
+    pools = {car.event_id: car for car in cars if car.username == POOL_USERNAME}
+    waiting = {}
+    for rider in Rider.query.filter(Rider.car_id.in_([pool.id for pool in pools.values()])).order_by(Rider.id):
+        waiting.setdefault(rider.event_id, []).append(rider)
+
+    slack = datetime.timedelta(minutes=int(current_app.config['MATCHING_SLACK_MINUTES']))
+    moves = []
+    for event_id, pool in pools.items():
+        if event_id in waiting:
+            moves += plan(pool, waiting[event_id], [car for car in cars
+                                                    if car.event_id == event_id and car is not pool], slack)
+    if moves:
+        seated = {}
+        for move in moves:
+            seated[move.car_id] = seated.get(move.car_id, 0) + 1
+            pool_id = pools[move.event_id].id
+            seated[pool_id] = seated.get(pool_id, 0) - 1
+        _apply(moves, seated)
+        BoardState.bump(*{move.event_id for move in moves})
+    return moves
+
+
+def release(car, seats):
+    """
+    Send `car`'s riders back to Need a Ride, newest first, until at most
+    `seats` remain. Returns how many were sent back.
+    """
+    riders = Rider.query.filter(Rider.car_id == car.id).order_by(Rider.id.desc()).all()
+    excess = riders[:max(len(riders) - seats, 0)]
+    if not excess:
+        return 0
+    pool = Car.query.filter(Car.event_id == car.event_id, Car.username == POOL_USERNAME).first()
+    if pool is None:
+        return 0
+    moves = [Move(rider.id, rider.username, rider.name, car.event_id, pool.id, pool.username) for rider in excess]
+    _apply(moves, {pool.id: len(excess), car.id: -len(excess)})
+    BoardState.bump(car.event_id)
+    return len(excess)
+
+
+def _apply(moves, seated):
+    db.session.execute(update(_riders).where(_riders.c.id == bindparam('b_rider_id'))
+                       .values(car_id=bindparam('b_car_id')),
+                       [{'b_rider_id': move.rider_id, 'b_car_id': move.car_id} for move in moves])
+    db.session.execute(update(_cars).where(_cars.c.id == bindparam('b_car_id'))
+                       .values(current_capacity=_cars.c.current_capacity + bindparam('b_seated')),
+                       [{'b_car_id': car_id, 'b_seated': count} for car_id, count in seated.items()])
+    # The ORM objects loaded before the UPDATEs no longer match the database.
+    db.session.expire_all()
+
+
+def notify(moves):
+    """Tell drivers who was seated in their cars, once the moves are committed."""
+    if not moves:
+        return
+    names = dict(Event.query.filter(Event.id.in_({move.event_id for move in moves}))
+                 .with_entities(Event.id, Event.name))
+    for move in moves:
+        send_join(move.driver, user_string(move.name, move.username), names[move.event_id])
@@ -0,0 +1,223 @@
+import hmac
+import threading
+import time
+
+from flask import Blueprint, Response, abort, current_app, g, has_app_context, request, \
+    before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request instrumentation. Request hooks time each request and SQLAlchemy
+# engine events add up its queries; Flask's template signals time rendering and
+# observe_http() records outbound calls. Each response gets a Server-Timing
+# header, and /metrics exposes per-route histograms in the Prometheus text
+# format. Numbers are per process: Prometheus should scrape every worker, or
+# sum what it gets.
+bp = Blueprint('metrics', __name__)
+
+# Upper bounds of the histogram buckets, in seconds and in statements.
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# Statements kept per request for the slow request log.
+SLOW_LOG_STATEMENTS = 50
+
+
+class Histogram:
+    """A Prometheus histogram with labels, kept in memory."""
+
+    def __init__(self, name, doc, labels, buckets):
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in series:
+            pairs = list(zip(self.labels, label_values))
+            for bound, bucket in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(pairs, le=bound)} {bucket}")
+            lines.append(f"{self.name}_bucket{_labels(pairs, le='+Inf')} {count}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {total}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {count}")
+        return lines
+
+
+def _labels(pairs, **extra):
+    pairs = list(pairs) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+REQUEST_SECONDS = Histogram("rideboard_request_seconds", "Time spent handling requests.",
+                            ("endpoint", "method", "status"), SECONDS)
+DB_SECONDS = Histogram("rideboard_request_db_seconds", "Time each request spent in SQL.",
+                       ("endpoint",), SECONDS)
+QUERY_COUNT = Histogram("rideboard_request_queries", "SQL statements executed by each request.",
+                        ("endpoint",), QUERIES)
+RENDER_SECONDS = Histogram("rideboard_request_render_seconds", "Time each request spent rendering templates.",
+                           ("endpoint",), SECONDS)
+HTTP_SECONDS = Histogram("rideboard_outbound_http_seconds", "Time spent on outbound HTTP calls.",
+                         ("target",), SECONDS)
+HISTOGRAMS = (REQUEST_SECONDS, DB_SECONDS, QUERY_COUNT, RENDER_SECONDS, HTTP_SECONDS)
+
+
+class RequestStats:
+
+    def __init__(self, keep_statements):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.render = 0.0
+        self.http = 0.0
+        self.statements = [] if keep_statements else None
+        # Start times of the templates being rendered, outermost first.
+        self.rendering = []
+
+
+def _stats():
+    # Engine events also fire outside requests (CLI commands, the live poller).
+    return g.get("request_stats") if has_app_context() else None
+
+
+def observe_http(target, seconds):
+    """Record an outbound HTTP call, against the current request if there is one."""
+    HTTP_SECONDS.observe(seconds, target)
+    stats = _stats()
+    if stats is not None:
+        stats.http += seconds
+
+
+def init_app(app):
+    app.before_request(_start)
+    app.after_request(_finish)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+    app.register_blueprint(bp)
+
+
+def _start():
+    g.request_stats = RequestStats(keep_statements=float(current_app.config["SLOW_REQUEST_MS"]) > 0)
+
+
+def _finish(response):
+    stats = _stats()
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - stats.started
+    endpoint = request.endpoint or "none"
+    REQUEST_SECONDS.observe(elapsed, endpoint, request.method, str(response.status_code))
+    DB_SECONDS.observe(stats.sql, endpoint)
+    QUERY_COUNT.observe(stats.queries, endpoint)
+    RENDER_SECONDS.observe(stats.render, endpoint)
+
+    timings = [
+        f'db;dur={stats.sql * 1000:.1f};desc="{stats.queries} queries"',
+        f"render;dur={stats.render * 1000:.1f}",
+        f"total;dur={elapsed * 1000:.1f}"
+    ]
+    if stats.http:
+        timings.insert(2, f"http;dur={stats.http * 1000:.1f}")
+    response.headers.add("Server-Timing", ", ".join(timings))
+
+    slow_ms = float(current_app.config["SLOW_REQUEST_MS"])
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        _log_slow(stats, elapsed)
+    return response
+
+
+def _log_slow(stats, elapsed):
+    print(f"Slow request: {request.method} {request.full_path.rstrip('?')} took {elapsed * 1000:.0f} ms "
+          f"({stats.queries} queries, {stats.sql * 1000:.0f} ms SQL, {stats.render * 1000:.0f} ms render, "
+          f"{stats.http * 1000:.0f} ms HTTP)")
+    for statement, seconds in stats.statements:
+        print(f"  {seconds * 1000:8.1f} ms  {' '.join(statement.split())}")
+    if stats.queries > len(stats.statements):
+        print(f"  ... and {stats.queries - len(stats.statements)} more")
+
+
+def _render_started(_app, **_extra):
+    stats = _stats()
+    if stats is not None:
+        stats.rendering.append(time.perf_counter())
+
+
+def _render_finished(_app, **_extra):
+    stats = _stats()
+    # Templates rendered from inside other templates are already part of the outer render.
+    if stats is not None and stats.rendering:
+        started = stats.rendering.pop()
+        if not stats.rendering:
+            stats.render += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, _cursor, statement, _parameters, _context, _executemany):
+    seconds = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _stats()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.sql += seconds
+    if stats.statements is not None and len(stats.statements) < SLOW_LOG_STATEMENTS:
+        stats.statements.append((statement, seconds))
+
+
+@event.listens_for(Engine, "handle_error")
+def _failed_execute(context):
+    # after_cursor_execute does not fire for a failed statement, so its start time is dropped here.
+    if context.connection is not None and context.execution_context is not None:
+        started = context.connection.info.get("query_started")
+        if started:
+            started.pop()
+
+
+def _cache_lines(app):
+    lines = []
+    for metric, doc in (("hits", "Cache lookups answered from the cache."),
+                        ("misses", "Cache lookups that missed.")):
+        lines += [f"# HELP rideboard_cache_{metric}_total {doc}", f"# TYPE rideboard_cache_{metric}_total counter"]
+        for name in ("user_cache", "card_cache", "calendar_cache"):
+            cache = app.extensions.get(name)
+            if cache is not None:
+                lines.append(f"rideboard_cache_{metric}_total{_labels([('cache', name)])} {cache.stats()[metric]}")
+    return lines
+
+
+@bp.route('/metrics')
+def metrics():
+    token = current_app.config["METRICS_TOKEN"]
+    # Route timings and query counts are not for the public: without a token there are no metrics.
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(403)
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    lines += _cache_lines(current_app)
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
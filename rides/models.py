@@ -2,8 +2,29 @@
 # File name: models.py             #
 # Author: Ayush Goel & Fred Rybin  #
 ####################################
+import datetime
+from collections import namedtuple
+
+from sqlalchemy import and_, or_, event, func, insert, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, selectinload, validates
+
 from rides import db
 
+# How long after it ends an event stays on the board.
+EXPIRY_GRACE = datetime.timedelta(hours=1)
+
+# What a user is doing in an event: 'driver' or 'rider' of car_id.
+Membership = namedtuple('Membership', ['role', 'car_id'])
+
+
+def enforce_foreign_keys(engine):
+    """SQLite only enforces foreign keys, and so ON DELETE CASCADE, on connections that ask for it."""
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', lambda dbapi_connection, _record:
+                     dbapi_connection.execute('PRAGMA foreign_keys=ON'))
+
+
 class User(db.Model):
     __tablename__ = 'user'
 
@@ -39,6 +60,12 @@ class User(db.Model):
 
 class Event(db.Model):
     __tablename__ = 'events'
+    __table_args__ = (
+        db.Index('ix_events_expired_start_time', 'expired', 'start_time'),
+        db.Index('ix_events_start_time_id', 'start_time', 'id'),
+        # Archived rows keep their ids, so SQLite must never hand them out again.
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(150), nullable=False)
@@ -47,7 +74,12 @@ class Event(db.Model):
     end_time = db.Column(db.DateTime, nullable=False)
     creator = db.Column(db.String(50), nullable=False)
     expired = db.Column(db.Boolean, default=False, nullable=False)
-    cars = db.relationship('Car', backref='events', lazy=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    # Bumped whenever the event, its cars or its riders change; keys the cached event card.
+    version = db.Column(db.Integer, nullable=False, default=0)
+    # Cars and riders go with their event in the database (ON DELETE CASCADE), not one by one. They are listed in
+    # the order they were added, Need a Ride first, whatever order the indexes return them in.
+    cars = db.relationship('Car', backref='events', lazy=True, order_by='Car.id', cascade='all', passive_deletes=True)
 
     def __init__(self, name, address, start_time, end_time, creator):
         self.name = name
@@ -59,8 +91,70 @@ class Event(db.Model):
     def __repr__(self):
         return '<id {}>'.format(self.id)
 
+    @classmethod
+    def with_cars_and_riders(cls):
+        """
+        Query for events with their cars and riders eagerly loaded. Loading the
+        whole board then costs three SELECTs no matter how many events there are.
+        """
+        return cls.query.options(selectinload(cls.cars).selectinload(Car.riders))
+
+    @classmethod
+    def live(cls, now):
+        """Condition for events still on the board: not expired, even if the sweeper has not run yet."""
+        return and_(cls.expired == False, cls.expires_at >= now)  # pylint: disable=singleton-comparison
+
+    @classmethod
+    def board(cls, now):
+        """Upcoming events, soonest first, with cars and riders loaded."""
+        return cls.with_cars_and_riders().filter(cls.live(now)).order_by(cls.start_time.asc())
+
+    @classmethod
+    def history_page(cls, now, limit, before=None):
+        """
+        One page of past events, newest first, from the live tables and the
+        archive. `before` is the (start_time, id) of the last event on the
+        previous page; seeking past it on the (start_time, id) indexes keeps
+        every page equally cheap.
+        """
+        expired = or_(cls.expired == True, cls.expires_at < now)  # pylint: disable=singleton-comparison
+        live = _seek(cls.with_cars_and_riders().filter(expired), cls, limit, before)
+        archived = _seek(ArchivedEvent.with_cars_and_riders(), ArchivedEvent, limit, before)
+        return sorted(live + archived, key=lambda event: (event.start_time, event.id), reverse=True)[:limit]
+
+    @classmethod
+    def expire(cls, now):
+        """
+        Flag every event whose expiry time has passed as expired, in a single
+        UPDATE. Returns the number of events expired.
+        """
+        count = cls.query.filter(cls.expired == False, cls.expires_at < now)\
+            .update({cls.expired: True}, synchronize_session=False)  # pylint: disable=singleton-comparison
+        if count:
+            BoardState.bump()
+        db.session.commit()
+        return count
+
+    @validates('end_time')
+    def _update_expires_at(self, _key, end_time):
+        self.expires_at = end_time + EXPIRY_GRACE
+        return end_time
+
+def _seek(query, model, limit, before):
+    if before is not None:
+        start_time, event_id = before
+        query = query.filter(or_(model.start_time < start_time,
+                                 and_(model.start_time == start_time, model.id < event_id)))
+    return query.order_by(model.start_time.desc(), model.id.desc()).limit(limit).all()
+
+
 class Car(db.Model):
     __tablename__ = 'cars'
+    __table_args__ = (
+        db.Index('ix_cars_event_id_name', 'event_id', 'name'),
+        db.Index('ix_cars_username_event_id', 'username', 'event_id'),
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     username = db.Column(db.String(80), nullable=False)
@@ -70,8 +164,10 @@ class Car(db.Model):
     departure_time = db.Column(db.DateTime, nullable=False)
     return_time = db.Column(db.DateTime, nullable=False)
     driver_comment = db.Column(db.Text)
-    event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
-    riders = db.relationship('Rider', backref='cars', lazy=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id', name='cars_event_id_fkey', ondelete='CASCADE'),
+                         nullable=False)
+    riders = db.relationship('Rider', backref='cars', lazy=True, order_by='Rider.id', cascade='all',
+                             passive_deletes=True)
 
     def __init__(self, username, name, current_capacity, max_capacity,
          departure_time, return_time, driver_comment, event_id):
@@ -87,18 +183,288 @@ class Car(db.Model):
     def __repr__(self):
         return '<id {}>'.format(self.id)
 
+    @classmethod
+    def offer(cls, car):
+        """
+        Add `car` to its event, unless its driver already drives or rides in
+        the event. The event's row stays locked until the caller commits, so a
+        concurrent Rider.join for the driver waits and then sees the car.
+        Returns whether the car was added.
+        """
+        BoardState.bump(car.event_id)
+        driving = select(cls.id).where(cls.event_id == car.event_id, cls.username == car.username).exists()
+        riding = select(Rider.id).where(Rider.event_id == car.event_id, Rider.username == car.username).exists()
+        if db.session.query(or_(driving, riding)).scalar():
+            return False
+        db.session.add(car)
+        return True
+
 class Rider(db.Model):
     __tablename__ = 'riders'
+    __table_args__ = (
+        # A user rides in at most one car per event.
+        db.UniqueConstraint('event_id', 'username', name='uq_riders_event_id_username'),
+        db.Index('ix_riders_car_id', 'car_id'),
+        db.Index('ix_riders_username_car_id', 'username', 'car_id'),
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     username = db.Column(db.String(80), nullable=False)
     name = db.Column(db.String(50), nullable=False)
-    car_id = db.Column(db.Integer, db.ForeignKey('cars.id'), nullable=False)
+    car_id = db.Column(db.Integer, db.ForeignKey('cars.id', name='riders_car_id_fkey', ondelete='CASCADE'),
+                       nullable=False)
+    event_id = db.Column(db.Integer, db.ForeignKey('events.id', name='riders_event_id_fkey', ondelete='CASCADE'),
+                         nullable=False)
 
-    def __init__(self, username, name, car_id):
+    def __init__(self, username, name, car_id, event_id):
         self.username = username
         self.name = name
         self.car_id = car_id
+        self.event_id = event_id
+
+    def __repr__(self):
+        return '<id {}>'.format(self.id)
+
+    @classmethod
+    def memberships(cls, username):
+        """
+        {event_id: Membership} for every event `username` drives or rides in,
+        from one query over both tables.
+        """
+        driving = select(Car.event_id, literal('driver').label('role'), Car.id.label('car_id'))\
+            .where(Car.username == username)
+        riding = select(cls.event_id, literal('rider').label('role'), cls.car_id).where(cls.username == username)
+        memberships = {}
+        for event_id, role, car_id in db.session.execute(driving.union_all(riding)):
+            # Driving wins should a driver also hold a seat in the event.
+            if event_id not in memberships or role == 'driver':
+                memberships[event_id] = Membership(role, car_id)
+        return memberships
+
+    @classmethod
+    def join(cls, car, username, name):
+        """
+        Take a seat in `car` for `username`, unless the car is full or the user
+        already drives or rides in this event. Safe against concurrent joins:
+        the seat is claimed with a conditional UPDATE and the one-ride-per-event
+        rule is enforced by uq_riders_event_id_username. Joins and new cars for
+        the same event take turns on the event's row (see Car.offer), so the
+        user cannot start driving in between. Returns whether the user joined.
+        """
+        # Bumping the event first holds its row lock until the commit.
+        BoardState.bump(car.event_id)
+        # Aliased, or the subquery would correlate with the car being updated.
+        other = aliased(Car)
+        driving = select(other.id).where(other.event_id == car.event_id, other.username == username).exists()
+        claimed = Car.query.filter(Car.id == car.id, ~driving,
+                                   or_(Car.current_capacity < Car.max_capacity, Car.max_capacity == 0))\
+            .update({Car.current_capacity: Car.current_capacity + 1}, synchronize_session=False)
+        if not claimed:
+            db.session.rollback()
+            return False
+        db.session.add(cls(username, name, car.id, car.event_id))
+        try:
+            # Committing flushes the new rider, which can trip the constraint.
+            db.session.commit()
+        except IntegrityError:
+            # Already riding in this event; rolling back also gives the seat back.
+            db.session.rollback()
+            return False
+        return True
+
+    @classmethod
+    def leave(cls, car, username):
+        """Give up `username`'s seat in `car`. Returns whether they were riding in it."""
+        left = cls.query.filter(cls.car_id == car.id, cls.username == username)\
+            .delete(synchronize_session=False)
+        if not left:
+            db.session.rollback()
+            return False
+        Car.query.filter(Car.id == car.id)\
+            .update({Car.current_capacity: Car.current_capacity - left}, synchronize_session=False)
+        BoardState.bump(car.event_id)
+        db.session.commit()
+        return True
+
+
+class BoardState(db.Model):
+    __tablename__ = 'board_state'
+
+    # A single row whose version is bumped by every change to events, cars or riders.
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<version {}>'.format(self.version)
+
+    @classmethod
+    def bump(cls, *event_ids):
+        """
+        Advance the board version, and those of the events that changed if
+        given, as part of the current transaction.
+        """
+        if not cls.query.filter(cls.id == 1).update({cls.version: cls.version + 1}, synchronize_session=False):
+            db.session.add(cls(id=1, version=1))
+        if event_ids:
+            Event.query.filter(Event.id.in_(event_ids))\
+                .update({Event.version: Event.version + 1}, synchronize_session=False)
+
+    @classmethod
+    def tag(cls, now):
+        """
+        A token that changes whenever the board would render differently: the
+        version, plus how many events have passed their expiry time but have
+        not been swept yet.
+        """
+        version = select(cls.version).where(cls.id == 1).scalar_subquery()
+        pending = and_(Event.expired == False, Event.expires_at < now)  # pylint: disable=singleton-comparison
+        unswept = select(func.count(Event.id)).where(pending).scalar_subquery()
+        board_version, pending_count = db.session.query(func.coalesce(version, 0), unswept).one()
+        return f'{board_version}.{pending_count}'
+
+
+class BoardChange(db.Model):
+    __tablename__ = 'board_changes'
+
+    # Change events for live board updates, read by every worker's poller.
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+
+    def __init__(self, kind, payload):
+        self.kind = kind
+        self.payload = payload
 
     def __repr__(self):
         return '<id {}>'.format(self.id)
+
+    @classmethod
+    def prune(cls, before):
+        """Delete change events older than `before` (UTC)."""
+        count = cls.query.filter(cls.created_at < before).delete(synchronize_session=False)
+        db.session.commit()
+        return count
+
+
+class StoredSession(db.Model):
+    __tablename__ = 'sessions'
+
+    # Server-side sessions (SESSION_BACKEND=database); the cookie only holds the id.
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# Cold storage for expired events. `flask archive-events` moves them here with
+# their cars and riders, in batches, so the live tables only hold the board.
+# Rows keep their ids; the archive only has the indexes /history needs.
+class ArchivedEvent(db.Model):
+    __tablename__ = 'events_archive'
+    __table_args__ = (
+        db.Index('ix_events_archive_start_time_id', 'start_time', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(150), nullable=False)
+    address = db.Column(db.Text, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    creator = db.Column(db.String(50), nullable=False)
+    # The event's version when it was archived, so a restored event never reuses a cached card's key.
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    cars = db.relationship('ArchivedCar', lazy=True, order_by='ArchivedCar.id', cascade='all', passive_deletes=True)
+
+    def __repr__(self):
+        return '<id {}>'.format(self.id)
+
+    @classmethod
+    def with_cars_and_riders(cls):
+        return cls.query.options(selectinload(cls.cars).selectinload(ArchivedCar.riders))
+
+    @classmethod
+    def archive(cls, batch_size):
+        """
+        Move events flagged as expired, with their cars and riders, into the
+        archive: copied with INSERT ... SELECT and deleted (cascading to their
+        cars and riders) `batch_size` events per transaction. Returns the
+        number of events archived.
+        """
+        count = 0
+        while True:
+            event_ids = [event_id for event_id, in db.session.query(Event.id)
+                         .filter(Event.expired == True)  # pylint: disable=singleton-comparison
+                         .order_by(Event.id).limit(batch_size).with_for_update()]
+            if not event_ids:
+                return count
+            _copy(Event, cls, Event.id.in_(event_ids), archived_at=literal(datetime.datetime.utcnow(), db.DateTime))
+            _copy(Car, ArchivedCar, Car.event_id.in_(event_ids))
+            _copy(Rider, ArchivedRider, Rider.event_id.in_(event_ids))
+            Event.query.filter(Event.id.in_(event_ids)).delete(synchronize_session=False)
+            db.session.commit()
+            count += len(event_ids)
+
+    def restore(self):
+        """Move this event back into the live tables, still expired. Returns the live Event."""
+        restored = Event(self.name, self.address, self.start_time, self.end_time, self.creator)
+        restored.id = self.id
+        restored.version = self.version
+        restored.expired = True
+        for archived_car in self.cars:
+            car = Car(archived_car.username, archived_car.name, archived_car.current_capacity,
+                      archived_car.max_capacity, archived_car.departure_time, archived_car.return_time,
+                      archived_car.driver_comment, self.id)
+            car.id = archived_car.id
+            for archived_rider in archived_car.riders:
+                rider = Rider(archived_rider.username, archived_rider.name, car.id, self.id)
+                rider.id = archived_rider.id
+                car.riders.append(rider)
+            restored.cars.append(car)
+        db.session.add(restored)
+        # Cars and riders are deleted along with the archived event by the database.
+        ArchivedEvent.query.filter(ArchivedEvent.id == self.id).delete(synchronize_session=False)
+        return restored
+
+
+class ArchivedCar(db.Model):
+    __tablename__ = 'cars_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    username = db.Column(db.String(80), nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+    current_capacity = db.Column(db.Integer, nullable=False)
+    max_capacity = db.Column(db.Integer, nullable=False)
+    departure_time = db.Column(db.DateTime, nullable=False)
+    return_time = db.Column(db.DateTime, nullable=False)
+    driver_comment = db.Column(db.Text)
+    event_id = db.Column(db.Integer, db.ForeignKey('events_archive.id', name='cars_archive_event_id_fkey',
+                                                   ondelete='CASCADE'), nullable=False, index=True)
+    riders = db.relationship('ArchivedRider', lazy=True, order_by='ArchivedRider.id', cascade='all',
+                             passive_deletes=True)
+
+    def __repr__(self):
+        return '<id {}>'.format(self.id)
+
+
+class ArchivedRider(db.Model):
+    __tablename__ = 'riders_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    username = db.Column(db.String(80), nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+    car_id = db.Column(db.Integer, db.ForeignKey('cars_archive.id', name='riders_archive_car_id_fkey',
+                                                 ondelete='CASCADE'), nullable=False, index=True)
+    event_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return '<id {}>'.format(self.id)
+
+
+def _copy(model, archive, condition, **extra):
+    # INSERT INTO archive (columns) SELECT columns FROM model WHERE condition, for the columns both have.
+    columns = [column.name for column in archive.__table__.columns if column.name in model.__table__.columns]
+    values = [model.__table__.c[name] for name in columns] + list(extra.values())
+    db.session.execute(insert(archive.__table__)
+                       .from_select(columns + list(extra), select(*values).where(condition)))
@@ -0,0 +1,50 @@
+from flask_pyoidc.flask_pyoidc import OIDCAuthentication
+from flask_pyoidc.provider_configuration import ProviderConfiguration, ClientMetadata
+from flask_pyoidc.pyoidc_facade import PyoidcFacade
+
+# flask_pyoidc sets up a client for every provider when it is attached to the
+# app, and each one fetches its issuer's discovery document over the network.
+# Clients are built here on first use instead, so starting a worker does not
+# wait on (or fail with) either SSO provider.
+
+
+class _LazyClients(dict):
+
+    def __init__(self, configurations, redirect_uri):
+        super().__init__()
+        self._configurations = configurations
+        self._redirect_uri = redirect_uri
+
+    def __missing__(self, name):
+        client = self[name] = PyoidcFacade(self._configurations[name], self._redirect_uri)
+        return client
+
+
+class LazyOIDCAuthentication(OIDCAuthentication):
+    """OIDCAuthentication that reads its providers from app config and connects to them lazily."""
+
+    def __init__(self):
+        # The oidc_auth decorators check provider names before any app exists.
+        super().__init__(dict.fromkeys(('default', 'google')))
+
+    def init_app(self, app):
+        configurations = {
+            'default': ProviderConfiguration(issuer=app.config["OIDC_ISSUER"],
+                                             client_metadata=ClientMetadata(
+                                                 app.config["OIDC_CLIENT_ID"],
+                                                 app.config["OIDC_CLIENT_SECRET"])),
+            'google': ProviderConfiguration(issuer=app.config["GOOGLE_ISSUER"],
+                                            client_metadata=ClientMetadata(
+                                                app.config["GOOGLE_CLIENT_ID"],
+                                                app.config["GOOGLE_CLIENT_SECRET"]),
+                                            auth_request_params={'scope': ['email', 'profile', 'openid']})
+        }
+        # Let flask_pyoidc register its redirect route without building any clients.
+        self._provider_configurations = {}
+        super().init_app(app)
+        self._provider_configurations = configurations
+        self.clients = _LazyClients(configurations, self._redirect_uri_config.full_uri)
+
+
+# OIDC Authentication
+auth = LazyOIDCAuthentication()
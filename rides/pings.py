@@ -1,48 +1,124 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+
 import requests
-from rides import app
+from flask import current_app
+from rides.metrics import observe_http
+
+Ping = namedtuple('Ping', ['route', 'username', 'body'])
+
+# Pings waiting to be delivered, drained by a single background thread per process.
+_outbox = queue.Queue(maxsize=1000)
+_worker = None
+_worker_pid = None
+# The app whose config the worker delivers with.
+_worker_app = None
+_worker_lock = threading.Lock()
+
+# The most recent pings that could not be delivered, with the reason why.
+dead_letters = deque(maxlen=100)
+
 
 def send_join(to, join, ride):
-    if not app.config["PINGS_ENABLED"]:
-        return
-    pings_join_route = app.config["PINGS_JOIN_ROUTE_UUID"]
-    pings_token = app.config["PINGS_TOKEN"]
-    if not pings_join_route or not pings_token:
-        print("Pings is not configured")
-        return
-    try:
-        requests.post(
-            f"https://pings.csh.rit.edu/service/route/{pings_join_route}/ping",
-            json = {
-                "username": to,
-                "body": f"@{join} has joined \"{ride}\""
-            },
-            headers = {
-                "Authorization": f"Bearer {pings_token}"
-            }
-        )
-    except requests.exceptions.RequestException as e:
-        print("Error sending ping")
-        print(e)
+    _enqueue(current_app.config["PINGS_JOIN_ROUTE_UUID"], to, f"@{join} has joined \"{ride}\"")
+
 
 def send_leave(to, leave, ride):
-    if not app.config["PINGS_ENABLED"]:
+    _enqueue(current_app.config["PINGS_LEAVE_ROUTE_UUID"], to, f"@{leave} has left \"{ride}\"")
+
+
+def flush(timeout=None):
+    """
+    Wait until every queued ping has been delivered or dead-lettered.
+    Returns False if the timeout ran out first.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while _outbox.unfinished_tasks:
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _enqueue(route, to, body):
+    if not current_app.config["PINGS_ENABLED"]:
         return
-    pings_leave_route = app.config["PINGS_LEAVE_ROUTE_UUID"]
-    pings_token = app.config["PINGS_TOKEN"]
-    if not pings_leave_route or not pings_token:
+    if not route or not current_app.config["PINGS_TOKEN"]:
         print("Pings is not configured")
         return
+    _ensure_worker(current_app._get_current_object())  # pylint: disable=protected-access
     try:
-        requests.post(
-            f"https://pings.csh.rit.edu/service/route/{pings_leave_route}/ping",
-            json = {
-                "username": to,
-                "body": f"@{leave} has left \"{ride}\""
-            },
-            headers = {
-                "Authorization": f"Bearer {pings_token}"
-            }
-        )
-    except requests.exceptions.RequestException as e:
-        print("Error sending ping")
-        print(e)
+        _outbox.put_nowait(Ping(route, to, body))
+    except queue.Full:
+        _dead_letter(Ping(route, to, body), "outbox full")
+
+
+def _ensure_worker(app):
+    global _worker, _worker_pid, _worker_app
+    # Threads do not survive a fork, so each gunicorn worker starts its own.
+    with _worker_lock:
+        _worker_app = app
+        if _worker is None or _worker_pid != os.getpid() or not _worker.is_alive():
+            _worker = threading.Thread(target=_drain, name="pings", daemon=True)
+            _worker_pid = os.getpid()
+            _worker.start()
+
+
+def _drain():
+    # One pooled session per worker thread keeps the connection to Pings alive between pings.
+    with requests.Session() as session:
+        while True:
+            ping = _outbox.get()
+            try:
+                _deliver(_worker_app.config, session, ping)
+            finally:
+                _outbox.task_done()
+
+
+def _deliver(config, session, ping):
+    attempts = max(1, int(config["PINGS_MAX_ATTEMPTS"]))
+    backoff = float(config["PINGS_BACKOFF"])
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        started = time.perf_counter()
+        try:
+            response = session.post(
+                f"{config['PINGS_URL']}/service/route/{ping.route}/ping",
+                json={
+                    "username": ping.username,
+                    "body": ping.body
+                },
+                headers={
+                    "Authorization": f"Bearer {config['PINGS_TOKEN']}"
+                },
+                timeout=float(config["PINGS_TIMEOUT"])
+            )
+        except requests.exceptions.RequestException as e:
+            reason = str(e)
+            continue
+        finally:
+            observe_http("pings", time.perf_counter() - started)
+        if response.ok:
+            return
+        reason = f"HTTP {response.status_code}"
+        # Client errors other than rate limiting will not succeed on a retry.
+        if response.status_code < 500 and response.status_code != 429:
+            break
+    _dead_letter(ping, reason)
+
+
+def _dead_letter(ping, reason):
+    print(f"Error sending ping to {ping.username}: {reason}")
+    dead_letters.append((ping, reason))
+
+
+@atexit.register
+def _flush_on_exit():
+    # Give pings queued by the last requests a chance to go out on shutdown.
+    if _worker_app is not None:
+        flush(timeout=float(_worker_app.config["PINGS_TIMEOUT"]))
@@ -0,0 +1,445 @@
+####################################
+# File name: routes.py             #
+# Author: Ayush Goel & Fred Rybin  #
+####################################
+import datetime
+import os
+import click
+from flask import Blueprint, current_app, render_template, send_from_directory, redirect, url_for, g, request, \
+    abort
+from flask_login import login_user, logout_user, login_required, current_user
+
+from rides import db, login_manager, eastern, fmt, local_now
+from rides.models import Event, Rider, Car, User, BoardState, BoardChange, ArchivedEvent
+from rides.forms import EventForm, CarForm
+from rides.oidc import auth
+from rides.caching import conditional
+from rides.database import read_replica
+from rides import matching, search
+from rides.utils import csh_user_auth, google_user_auth, user_string
+from rides.pings import send_join, send_leave
+from rides.live import publish_board, publish_car
+from rides.sessions import ServerSessionInterface
+
+# CLI commands are registered as top-level `flask` commands.
+bp = Blueprint('rides', __name__, cli_group=None)
+
+
+# Favicon
+@bp.route('/favicon.ico')
+def favicon():
+    return send_from_directory(os.path.join(current_app.root_path, 'static/assets'),
+                               'favicon.ico', mimetype='image/vnd.microsoft.icon')
+
+
+@bp.route('/demo')
+def demo(auth_dict=None):
+    # Get current EST time.
+    loc_dt = datetime.datetime.now(tz=eastern)
+    st = loc_dt.strftime(fmt)
+    return render_template('demo.html', timestamp=st, datetime=datetime, auth_dict=auth_dict)
+
+
+# LOG IN MANAGEMENT
+
+
+@bp.route('/login')
+@bp.route('/')
+def login(auth_dict=None):
+    return render_template('login.html', auth_dict=auth_dict)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    user_cache = current_app.extensions['user_cache']
+    user = user_cache.get(user_id)
+    if user is None:
+        q = User.query.get(user_id)
+        if q is None:
+            return None
+        # Cache a detached copy so it stays usable after the session that loaded it is gone.
+        user = User(q.id, q.firstname, q.lastname, q.picture)
+        user_cache.set(user_id, user)
+    return user
+
+
+@bp.route("/logout")
+@auth.oidc_logout
+def _logout():
+    logout_user()
+    return redirect("/", 302)
+
+
+@bp.route('/csh-auth')
+@auth.oidc_auth('default')
+@csh_user_auth
+def csh_auth(auth_dict=None):
+    if auth_dict is None:
+        return redirect(url_for('rides.login'))
+    q = User.query.get(auth_dict['uid'])
+    if q is not None:
+        g.user = q
+        q.firstname = auth_dict['first']
+        q.lastname = auth_dict['last']
+        q.picture = auth_dict['picture']
+    else:
+        user = User(auth_dict['uid'], auth_dict['first'], auth_dict['last'], auth_dict['picture'])
+        g.user = user
+        db.session.add(user)
+
+    db.session.commit()
+    current_app.extensions['user_cache'].delete(auth_dict['uid'])
+    login_user(g.user)
+    return redirect(url_for('rides.index'))
+
+# TODO: Potential conflicts between google id and csh id and other ids.
+
+@bp.route('/google-auth')
+@auth.oidc_auth('google')
+@google_user_auth
+def google_auth(auth_dict=None):
+    if auth_dict is None:
+        return redirect(url_for('rides.login'))
+    q = User.query.get(auth_dict['uid'])
+    if q is not None:
+        q.firstname = auth_dict['first']
+        q.lastname = auth_dict['last']
+        q.picture = auth_dict['picture']
+        g.user = q
+    else:
+        user = User(auth_dict['uid'], auth_dict['first'], auth_dict['last'], auth_dict['picture'])
+        g.user = user
+        db.session.add(user)
+
+    db.session.commit()
+    current_app.extensions['user_cache'].delete(auth_dict['uid'])
+    login_user(g.user)
+    return redirect(url_for('rides.index'))
+
+
+# Application
+
+
+@bp.route('/home')
+@login_required
+@read_replica
+def index():
+    def build(now):
+        st = now.strftime(fmt)
+
+        memberships = Rider.memberships(current_user.id) if current_user.is_authenticated else {}
+
+        # Events past their expiry time are hidden here even before the sweeper flags them.
+        events = Event.board(now).all()
+        return render_template('index.html', events=events, timestamp=st, datetime=datetime,
+                               memberships=memberships)
+    return conditional(build)
+
+
+@bp.route('/history')
+@login_required
+@read_replica
+def history():
+    def build(now):
+        st = now.strftime(fmt)
+        events, next_page = history_page(now)
+        return render_template('history.html', events=events, next_page=next_page,
+                               collapse=next_page or len(events) != 1, timestamp=st, datetime=datetime)
+    return conditional(build)
+
+
+@bp.route('/history/more')
+@login_required
+@read_replica
+def history_more():
+    try:
+        before = (datetime.datetime.fromisoformat(request.args['before']), int(request.args['before_id']))
+    except (KeyError, ValueError):
+        abort(400)
+    events, next_page = history_page(local_now(), before)
+    return render_template('history_events.html', events=events, next_page=next_page, collapse=True,
+                           datetime=datetime)
+
+
+def history_page(now, before=None):
+    # Fetch one extra event to find out whether there is another page.
+    page_size = int(current_app.config['HISTORY_PAGE_SIZE'])
+    events = Event.history_page(now, page_size + 1, before)
+    if len(events) > page_size:
+        events = events[:page_size]
+        return events, (events[-1].start_time, events[-1].id)
+    return events, None
+
+
+# Event Form
+@bp.route('/eventform', methods=['GET', 'POST'])
+@login_required
+def eventform():
+    # Time to prepopulate the datetime field
+    loc_dt = datetime.datetime.now(tz=eastern)
+    st = loc_dt.strftime(fmt)
+    form = EventForm()
+    if form.validate_on_submit():
+        name = form.name.data
+        address = form.address.data
+        start_time = datetime.datetime(int(form.start_date_time.data.year),
+                                       int(form.start_date_time.data.month),
+                                       int(form.start_date_time.data.day),
+                                       int(form.start_date_time.data.hour),
+                                       int(form.start_date_time.data.minute))
+        end_time = datetime.datetime(int(form.end_date_time.data.year),
+                                     int(form.end_date_time.data.month),
+                                     int(form.end_date_time.data.day),
+                                     int(form.end_date_time.data.hour),
+                                     int(form.end_date_time.data.minute))
+        creator = current_user.id
+        event = Event(name, address, start_time, end_time, creator)
+        db.session.add(event)
+        db.session.commit()
+        infinity = Car('∞', 'Need a Ride', 0, 0, start_time, end_time, "", event.id)
+        db.session.add(infinity)
+        search.index_event(event)
+        BoardState.bump()
+        db.session.commit()
+        publish_board(event.id)
+        return redirect(url_for('rides.index'))
+    return render_template('eventform.html', form=form, timestamp=st)
+
+
+# Edit event form
+@bp.route('/edit/eventform/<string:eventid>', methods=['GET', 'POST'])
+@login_required
+def editeventform(eventid):
+    username = current_user.id
+    event = Event.query.get(eventid) or ArchivedEvent.query.get(eventid)
+    if event is not None and username == event.creator:
+        form = EventForm()
+        if form.validate_on_submit():
+            if isinstance(event, ArchivedEvent):
+                # Editing an archived event brings it back, and onto the board if its new time is upcoming.
+                event = event.restore()
+            event.name = form.name.data
+            event.address = form.address.data
+            event.start_time = datetime.datetime(int(form.start_date_time.data.year),
+                                                 int(form.start_date_time.data.month),
+                                                 int(form.start_date_time.data.day),
+                                                 int(form.start_date_time.data.hour),
+                                                 int(form.start_date_time.data.minute))
+            event.end_time = datetime.datetime(int(form.end_date_time.data.year),
+                                               int(form.end_date_time.data.month),
+                                               int(form.end_date_time.data.day),
+                                               int(form.end_date_time.data.hour),
+                                               int(form.end_date_time.data.minute))
+            event.creator = current_user.id
+            event.expired = False
+            car = Car.query.filter(Car.event_id == eventid).filter(Car.name == "Need a Ride").first()
+            car.departure_time = datetime.datetime(int(form.start_date_time.data.year),
+                                                   int(form.start_date_time.data.month),
+                                                   int(form.start_date_time.data.day),
+                                                   int(form.start_date_time.data.hour),
+                                                   int(form.start_date_time.data.minute))
+            car.return_time = datetime.datetime(int(form.end_date_time.data.year),
+                                                int(form.end_date_time.data.month),
+                                                int(form.end_date_time.data.day),
+                                                int(form.end_date_time.data.hour),
+                                                int(form.end_date_time.data.minute))
+            search.index_event(event)
+            BoardState.bump(event.id)
+            db.session.commit()
+            publish_board(event.id)
+            return redirect(url_for('rides.index'))
+    return render_template('editeventform.html', form=form, event=event)
+
+
+# Car form
+@bp.route('/carform/<string:eventid>', methods=['GET', 'POST'])
+@login_required
+def carform(eventid):
+    form = CarForm()
+    event = Event.query.get(eventid)
+    if form.validate_on_submit():
+        username = current_user.id
+        name = current_user.firstname + " " + current_user.lastname
+        current_capacity = 0
+        max_capacity = int(form.max_capacity.data['max_capacity'])
+        departure_time = datetime.datetime(int(form.departure_date_time.data.year),
+                                           int(form.departure_date_time.data.month),
+                                           int(form.departure_date_time.data.day),
+                                           int(form.departure_date_time.data.hour),
+                                           int(form.departure_date_time.data.minute))
+        return_time = datetime.datetime(int(form.return_date_time.data.year),
+                                        int(form.return_date_time.data.month),
+                                        int(form.return_date_time.data.day),
+                                        int(form.return_date_time.data.hour),
+                                        int(form.return_date_time.data.minute))
+        driver_comment = form.comments.data
+        event_id = eventid
+        car = Car(username, name, current_capacity, max_capacity, departure_time, return_time, driver_comment, event_id)
+        if not Car.offer(car):
+            # Already driving or riding in this event.
+            db.session.rollback()
+            return redirect(url_for('rides.index'))
+        # The new seats go to whoever is waiting in Need a Ride.
+        moves = matching.match([car.event_id])
+        db.session.commit()
+        publish_board(car.event_id)
+        matching.notify(moves)
+        return redirect(url_for('rides.index'))
+    return render_template('carform.html', form=form, event=event)
+
+
+# Edit car form
+@bp.route('/edit/carform/<string:carid>', methods=['GET', 'POST'])
+@login_required
+def editcarform(carid):
+    username = current_user.id
+    car = Car.query.get(carid)
+    if username == car.username and car is not None:
+        form = CarForm()
+        if form.validate_on_submit():
+            car.username = current_user.id
+            car.name = current_user.firstname + " " + current_user.lastname
+            car.max_capacity = int(form.max_capacity.data['max_capacity'])
+            car.departure_time = datetime.datetime(int(form.departure_date_time.data.year),
+                                                   int(form.departure_date_time.data.month),
+                                                   int(form.departure_date_time.data.day),
+                                                   int(form.departure_date_time.data.hour),
+                                                   int(form.departure_date_time.data.minute))
+            car.return_time = datetime.datetime(int(form.return_date_time.data.year),
+                                                int(form.return_date_time.data.month),
+                                                int(form.return_date_time.data.day),
+                                                int(form.return_date_time.data.hour),
+                                                int(form.return_date_time.data.minute))
+            car.driver_comment = form.comments.data
+            BoardState.bump(car.event_id)
+            # Riders who no longer fit go back to Need a Ride, and from there to any other car with room.
+            matching.release(car, car.max_capacity)
+            moves = matching.match([car.event_id])
+            db.session.commit()
+            publish_board(car.event_id)
+            matching.notify(moves)
+            return redirect(url_for('rides.index'))
+    return render_template('editcarform.html', form=form, car=car)
+
+
+# Join a ride
+@bp.route('/join/<string:car_id>/<user>', methods=["POST"])
+@login_required
+def join_ride(car_id, user):
+    username = current_user.id
+    name = current_user.firstname + " " + current_user.lastname
+    car = Car.query.get(car_id)
+    attempted_username = user
+    if attempted_username == username and car is not None:
+        if Rider.join(car, username, name):
+            event = Event.query.get(car.event_id)
+            send_join(car.username, user_string(name, username), event.name)
+            # Joining Need a Ride while other cars have room gets a seat straight away.
+            moves = matching.match([car.event_id])
+            db.session.commit()
+            if moves:
+                publish_board(car.event_id)
+            else:
+                publish_car(car)
+            matching.notify(moves)
+    return redirect(url_for('rides.index'))
+
+
+# Delete Car
+@bp.route('/delete/car/<string:car_id>', methods=["POST"])
+@login_required
+def delete_car(car_id):
+    username = current_user.id
+    car = Car.query.get(car_id)
+    if car.username == username and car is not None:
+        event_id = car.event_id
+        # The car's riders go back to Need a Ride, and from there to any other car with room.
+        matching.release(car, 0)
+        Car.query.filter(Car.id == car.id).delete(synchronize_session=False)
+        BoardState.bump(event_id)
+        moves = matching.match([event_id])
+        db.session.commit()
+        publish_board(event_id)
+        matching.notify(moves)
+    return redirect(url_for('rides.index'))
+
+
+# Delete Event
+@bp.route('/delete/ride/<string:event_id>', methods=["POST"])
+@login_required
+def delete_ride(event_id):
+    username = current_user.id
+    event = Event.query.get(event_id) or ArchivedEvent.query.get(event_id)
+    if event is not None and event.creator == username:
+        # Cars and riders are deleted along with the event by the database.
+        type(event).query.filter(type(event).id == event.id).delete(synchronize_session=False)
+        search.remove_event(event.id)
+        BoardState.bump()
+        db.session.commit()
+        publish_board(int(event_id))
+    return redirect(url_for('rides.index'))
+
+
+# Leave a ride
+@bp.route('/delete/rider/<string:car_id>/<string:rider_username>', methods=["POST"])
+@login_required
+def leave_ride(car_id, rider_username):
+    username = current_user.id
+    car = Car.query.get(car_id)
+    if rider_username == username and car is not None and Rider.leave(car, username):
+        event = Event.query.get(car.event_id)
+        send_leave(car.username, user_string(f"{current_user.firstname} {current_user.lastname}", username),
+                   event.name)
+        # The freed seat goes to whoever is waiting in Need a Ride.
+        moves = matching.match([car.event_id])
+        db.session.commit()
+        if moves:
+            publish_board(car.event_id)
+        else:
+            publish_car(car)
+        matching.notify(moves)
+    return redirect(url_for('rides.index'))
+
+
+# Maintenance
+
+
+@bp.cli.command('expire-events')
+def expire_events():
+    """Flag events that are past their expiry time as expired."""
+    count = Event.expire(local_now())
+    print(f"Expired {count} event(s)")
+    if count:
+        publish_board()
+    # Live update subscribers only ever need the last few minutes of changes.
+    BoardChange.prune(datetime.datetime.utcnow() - datetime.timedelta(days=1))
+
+
+@bp.cli.command('archive-events')
+@click.option('--batch-size', type=int, help='Events moved per transaction (default: ARCHIVE_BATCH_SIZE).')
+def archive_events(batch_size):
+    """Move expired events, with their cars and riders, into the archive tables."""
+    count = ArchivedEvent.archive(batch_size or int(current_app.config['ARCHIVE_BATCH_SIZE']))
+    print(f"Archived {count} event(s)")
+
+
+@bp.cli.command('prune-sessions')
+def prune_sessions():
+    """Delete server-side sessions past their expiry time."""
+    interface = current_app.session_interface
+    if not isinstance(interface, ServerSessionInterface):
+        print("Sessions are kept in cookies, nothing to prune")
+        return
+    print(f"Pruned {interface.store.prune()} session(s)")
+
+
+@bp.cli.command('match-riders')
+@click.option('--event', 'event_ids', type=int, multiple=True, help='Only match riders in this event (repeatable).')
+def match_riders(event_ids):
+    """Seat riders waiting in Need a Ride in cars with free seats."""
+    moves = matching.match(list(event_ids) or None)
+    db.session.commit()
+    print(f"Seated {len(moves)} rider(s) in {len({move.car_id for move in moves})} car(s)")
+    for event_id in sorted({move.event_id for move in moves}):
+        publish_board(event_id)
+    matching.notify(moves)
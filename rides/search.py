@@ -0,0 +1,129 @@
+import datetime
+import re
+from collections import namedtuple
+
+from flask import Blueprint, abort, current_app, render_template, request
+from flask_login import login_required
+from sqlalchemy import DDL, event, text
+
+from rides import db, local_now
+from rides.database import read_replica
+from rides.models import ArchivedEvent, Event
+
+# Full-text search over event names and addresses, on the board and in the
+# archive. event_search holds one document per event id: a tsvector with a GIN
+# index on Postgres, an FTS5 table keyed by rowid on SQLite. The event forms
+# keep it in sync; archiving and restoring keep ids, so they need nothing.
+# Every term is matched as a prefix, all terms must match, and names weigh
+# more than addresses. Only the page asked for is fetched from the index, and
+# pages stop at SEARCH_MAX_PAGES. Only the newest SEARCH_CANDIDATES matches are
+# ranked, so a search costs the same as history grows.
+bp = Blueprint('search', __name__)
+
+Result = namedtuple('Result', ['event', 'upcoming'])
+
+TERM = re.compile(r'\w+')
+# Terms beyond this are ignored.
+MAX_TERMS = 8
+
+POSTGRES_DOCUMENT = ("setweight(to_tsvector('english', {name}), 'A') || "
+                     "setweight(to_tsvector('english', {address}), 'B')")
+
+# Created along with the events table, so db.create_all() sets search up too.
+event.listen(Event.__table__, 'after_create', DDL(
+    "CREATE VIRTUAL TABLE event_search USING fts5(name, address, tokenize='porter unicode61')"
+).execute_if(dialect='sqlite'))
+event.listen(Event.__table__, 'after_create', DDL(
+    "CREATE TABLE event_search (event_id INTEGER PRIMARY KEY, document TSVECTOR NOT NULL)"
+).execute_if(dialect='postgresql'))
+event.listen(Event.__table__, 'after_create', DDL(
+    "CREATE INDEX ix_event_search_document ON event_search USING GIN (document)"
+).execute_if(dialect='postgresql'))
+event.listen(Event.__table__, 'before_drop', DDL("DROP TABLE IF EXISTS event_search"))
+
+
+def init_app(app):
+    app.register_blueprint(bp)
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def index_event(ev):
+    """Add or update `ev` in the search index, as part of the current transaction."""
+    params = {'id': ev.id, 'name': ev.name, 'address': ev.address}
+    if _dialect() == 'postgresql':
+        db.session.execute(text(
+            "INSERT INTO event_search (event_id, document) VALUES (:id, "
+            + POSTGRES_DOCUMENT.format(name=':name', address=':address') + ") "
+            "ON CONFLICT (event_id) DO UPDATE SET document = EXCLUDED.document"), params)
+    else:
+        remove_event(ev.id)
+        db.session.execute(text("INSERT INTO event_search (rowid, name, address) VALUES (:id, :name, :address)"),
+                           params)
+
+
+def remove_event(event_id):
+    """Drop an event from the search index, as part of the current transaction."""
+    if _dialect() == 'postgresql':
+        db.session.execute(text("DELETE FROM event_search WHERE event_id = :id"), {'id': event_id})
+    else:
+        db.session.execute(text("DELETE FROM event_search WHERE rowid = :id"), {'id': event_id})
+
+
+def search(query, limit, offset=0):
+    """
+    Up to `limit` event ids matching `query`, best first, skipping `offset`.
+    Terms are matched as prefixes and must all match.
+    """
+    terms = [term.lower() for term in TERM.findall(query)][:MAX_TERMS]
+    if not terms:
+        return []
+    # Only the newest matches are ranked, so common terms cost no more as history grows.
+    params = {'limit': limit, 'offset': offset, 'candidates': int(current_app.config['SEARCH_CANDIDATES'])}
+    if _dialect() == 'postgresql':
+        params['query'] = ' & '.join(f'{term}:*' for term in terms)
+        sql = ("SELECT event_id FROM (SELECT event_id, document FROM event_search "
+               "WHERE document @@ to_tsquery('english', :query) ORDER BY event_id DESC LIMIT :candidates) newest "
+               "ORDER BY ts_rank(document, to_tsquery('english', :query)) DESC, event_id DESC "
+               "LIMIT :limit OFFSET :offset")
+    else:
+        params['query'] = ' '.join(f'"{term}"*' for term in terms)
+        # bm25 is lower for better matches; the weights favour the name column.
+        sql = ("SELECT rowid FROM event_search WHERE event_search MATCH :query AND rowid >= "
+               "(SELECT min(rowid) FROM (SELECT rowid FROM event_search WHERE event_search MATCH :query "
+               "ORDER BY rowid DESC LIMIT :candidates)) "
+               "ORDER BY bm25(event_search, 10.0, 1.0), rowid DESC LIMIT :limit OFFSET :offset")
+    return [event_id for event_id, in db.session.execute(text(sql), params)]
+
+
+def results(event_ids, now):
+    """The events for `event_ids`, from the live tables or the archive, in the same order."""
+    if not event_ids:
+        return []
+    events = {ev.id: ev for ev in Event.query.filter(Event.id.in_(event_ids))}
+    upcoming = {ev.id for ev in events.values() if not ev.expired and ev.expires_at >= now}
+    missing = [event_id for event_id in event_ids if event_id not in events]
+    if missing:
+        events.update((ev.id, ev) for ev in ArchivedEvent.query.filter(ArchivedEvent.id.in_(missing)))
+    return [Result(events[event_id], event_id in upcoming) for event_id in event_ids if event_id in events]
+
+
+@bp.route('/search')
+@login_required
+@read_replica
+def search_events():
+    query = request.args.get('q', '').strip()
+    try:
+        page = int(request.args.get('page', 1))
+    except ValueError:
+        abort(400)
+    if not 1 <= page <= int(current_app.config['SEARCH_MAX_PAGES']):
+        abort(404)
+    page_size = int(current_app.config['SEARCH_PAGE_SIZE'])
+    # One extra id tells whether there is another page.
+    event_ids = search(query, page_size + 1, (page - 1) * page_size)
+    found = results(event_ids[:page_size], local_now())
+    more = len(event_ids) > page_size and page < int(current_app.config['SEARCH_MAX_PAGES'])
+    return render_template('search.html', query=query, results=found, page=page, more=more, datetime=datetime)
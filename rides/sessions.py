@@ -0,0 +1,190 @@
+import datetime
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import time
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from sqlalchemy import delete, insert, select, update
+from werkzeug.datastructures import CallbackDict
+
+from rides import db
+from rides.models import StoredSession
+
+# Server-side sessions. flask-pyoidc keeps the user's tokens and userinfo in
+# the session: several KB that a cookie session uploads with every request
+# and that is verified and decoded every time. With SESSION_BACKEND set to
+# "database" or "filesystem" the cookie only carries a random session id and
+# the data stays on the server, SESSION_TTL seconds past its last save.
+# Sessions are only written when they change, or to push the expiry back once
+# half the TTL has gone by. `flask prune-sessions` deletes expired sessions.
+# "cookie", the default, keeps Flask's signed cookie sessions.
+
+
+class ServerSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, expires=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        # When the stored copy expires, in seconds since the epoch.
+        self.expires = expires
+        # Logging in or out gets a new session id, so an id handed out before cannot be used after.
+        self.user = self.get('_user_id')
+        self.modified = False
+
+
+class DatabaseStore:
+    """Sessions in the sessions table, shared by every worker and host. Always uses the primary database."""
+
+    table = StoredSession.__table__
+
+    def load(self, sid):
+        now = datetime.datetime.utcnow()
+        with db.engine.connect() as conn:
+            row = conn.execute(select(self.table.c.data, self.table.c.expires_at)
+                               .where(self.table.c.id == sid, self.table.c.expires_at > now)).first()
+        if row is None:
+            return None
+        return row.data, row.expires_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+    def save(self, sid, data, expires):
+        expires_at = datetime.datetime.utcfromtimestamp(expires)
+        with db.engine.begin() as conn:
+            updated = conn.execute(update(self.table).where(self.table.c.id == sid)
+                                   .values(data=data, expires_at=expires_at))
+            if not updated.rowcount:
+                conn.execute(insert(self.table).values(id=sid, data=data, expires_at=expires_at))
+
+    def delete(self, sid):
+        with db.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.id == sid))
+
+    def prune(self):
+        now = datetime.datetime.utcnow()
+        with db.engine.begin() as conn:
+            return conn.execute(delete(self.table).where(self.table.c.expires_at <= now)).rowcount
+
+
+class FileSystemStore:
+    """Sessions as JSON files in a directory, shared by every worker on the host."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        # Hashing the id keeps whatever the cookie holds out of the path.
+        return os.path.join(self.directory, hashlib.sha256(sid.encode()).hexdigest() + ".json")
+
+    def load(self, sid):
+        entry = self._read(self._path(sid))
+        if entry is None or entry["expires"] <= time.time():
+            return None
+        return entry["data"], entry["expires"]
+
+    def save(self, sid, data, expires):
+        # Write to a temporary file and rename it so readers never see half a session.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"data": data, "expires": expires}, f)
+        os.replace(tmp, self._path(sid))
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except OSError:
+            pass
+
+    def prune(self):
+        count = 0
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            stored = self._read(entry.path)
+            if stored is None or stored["expires"] <= now:
+                try:
+                    os.remove(entry.path)
+                    count += 1
+                except OSError:
+                    pass
+        return count
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+class ServerSessionInterface(SessionInterface):
+    """Keeps session data in `store` and only the session id in the cookie."""
+
+    serializer = session_json_serializer
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            stored = self.store.load(sid)
+            if stored is not None:
+                data, expires = stored
+                try:
+                    return ServerSession(self.serializer.loads(data), sid, expires)
+                except ValueError:
+                    pass
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        # An emptied session is deleted along with its cookie; an empty one is never stored.
+        if not session:
+            if session.modified:
+                if session.sid is not None:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite,
+                                       httponly=httponly)
+            return
+
+        response.vary.add("Cookie")
+        new_sid = session.sid is None or session.get('_user_id') != session.user
+        now = time.time()
+        if new_sid or session.modified or session.expires - now < self.ttl / 2:
+            if new_sid:
+                if session.sid is not None:
+                    self.store.delete(session.sid)
+                session.sid = secrets.token_urlsafe(32)
+            session.expires = now + self.ttl
+            self.store.save(session.sid, self.serializer.dumps(dict(session)), session.expires)
+
+        if new_sid or self.should_set_cookie(app, session):
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session), httponly=httponly,
+                                domain=domain, path=path, secure=secure, samesite=samesite)
+
+
+def init_app(app):
+    backend = app.config["SESSION_BACKEND"]
+    if backend == "database":
+        store = DatabaseStore()
+    elif backend == "filesystem":
+        store = FileSystemStore(app.config["SESSION_DIR"])
+    elif backend == "cookie":
+        return
+    else:
+        raise ValueError(f"Unknown session backend {backend!r}")
+    app.session_interface = ServerSessionInterface(store, int(app.config["SESSION_TTL"]))
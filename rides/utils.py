@@ -40,3 +40,14 @@ def google_user_auth(func):
 
 def latin_to_utf8(string):
     return str(bytes(string, encoding='latin1'), encoding='utf8')
+
+
+def user_string(name, username):
+    """How a rider is named in pings to drivers."""
+    user_str = name
+    # if the first character if the username is a digit, it is not a csh user
+    if not username[0].isdigit():
+        user_str += f" (@{username})"
+    if user_str[0] == "@":
+        user_str = user_str[1:]
+    return user_str
@@ -0,0 +1,78 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import rides  # pylint: disable=wrong-import-position
+from rides import models  # pylint: disable=wrong-import-position
+
+
+@pytest.fixture
+def app_config():
+    """Extra config for the app fixture; override it in a test module to change settings read at startup."""
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, app_config):
+    """The app on a scratch SQLite database, with the tables created."""
+    # create_app reads config.env.py from the working directory.
+    monkeypatch.chdir(ROOT)
+    app = rides.create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'rides.db'}?timeout=30",
+        'WTF_CSRF_ENABLED': False,
+        'LIVE_BACKEND': 'memory',
+        'PINGS_ENABLED': False,
+        'SESSION_BACKEND': 'cookie',
+        **app_config
+    })
+    # Only the primary's tables: an earlier app's replica bind stays registered on db, without an engine here.
+    with app.app_context():
+        rides.db.create_all(bind_key=None)
+    yield app
+    live = app.extensions.get('live_broker')
+    if hasattr(live, 'close'):
+        live.close()
+    with app.app_context():
+        rides.db.session.remove()
+        rides.db.drop_all(bind_key=None)
+        for engine in rides.db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, username):
+    """Log `username` in the way the OIDC callbacks do, without SSO."""
+    with client.session_transaction() as session:
+        session['_user_id'] = username
+        session['_fresh'] = True
+
+
+def add_user(username):
+    rides.db.session.add(models.User(username, 'User', username, ''))
+
+
+def add_event(start, creator='creator', cars=0, seats=4, riders=0):
+    """An event with its Need a Ride car and `cars` cars of `riders` riders each. Flushed, not committed."""
+    db = rides.db
+    event = models.Event('Event', 'Somewhere', start, start + datetime.timedelta(hours=3), creator)
+    db.session.add(event)
+    db.session.flush()
+    db.session.add(models.Car('∞', 'Need a Ride', 0, 0, event.start_time, event.end_time, '', event.id))
+    for n in range(cars):
+        car = models.Car(f'driver{event.id}-{n}', 'Driver', riders, seats, event.start_time, event.end_time, '',
+                         event.id)
+        db.session.add(car)
+        db.session.flush()
+        for m in range(riders):
+            db.session.add(models.Rider(f'rider{event.id}-{n}-{m}', 'Rider', car.id, event.id))
+    db.session.flush()
+    return event
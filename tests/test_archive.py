@@ -0,0 +1,43 @@
+import datetime
+
+from conftest import add_event, add_user, login
+from rides import db, local_now
+from rides.models import ArchivedEvent, Car, Event, Rider
+
+
+def test_restored_event_does_not_reuse_cached_cards(app, client):
+    now = local_now()
+    with app.app_context():
+        add_user('creator')
+        event = add_event(now + datetime.timedelta(days=1), cars=1)
+        db.session.commit()
+        event_id = event.id
+    login(client, 'creator')
+    # Cache the card of every version the event goes through.
+    for n in range(3):
+        assert client.get('/home').status_code == 200
+        with app.app_context():
+            car = Car.query.filter(Car.event_id == event_id, Car.max_capacity == 4).one()
+            assert Rider.join(car, f'rider{n}', f'Rider {n}')
+    with app.app_context():
+        Event.query.filter(Event.id == event_id).update({Event.expired: True})
+        db.session.commit()
+        ArchivedEvent.archive(10)
+        archived_version = ArchivedEvent.query.get(event_id).version
+        assert archived_version > 0
+
+    later = now + datetime.timedelta(days=2)
+    response = client.post(f'/edit/eventform/{event_id}', data={
+        'name': 'Back again',
+        'address': 'Somewhere',
+        'start_date_time': later.strftime('%Y-%m-%d %H:%M'),
+        'end_date_time': (later + datetime.timedelta(hours=3)).strftime('%Y-%m-%d %H:%M')
+    })
+    assert response.status_code == 302
+    with app.app_context():
+        restored = Event.query.get(event_id)
+        assert restored.version > archived_version
+        assert app.extensions['card_cache'].get(f'card:{event_id}:{restored.version}') is None
+    response = client.get('/home')
+    assert response.status_code == 200
+    assert b'Rider 2' in response.data
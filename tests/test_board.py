@@ -0,0 +1,50 @@
+import datetime
+
+from conftest import add_event, add_user, login
+from rides import db, local_now
+from rides.models import ArchivedEvent, Car, Event, Rider
+
+
+def seed_out_of_order(start):
+    """An event whose cars and riders are added in the opposite of alphabetical order."""
+    event = add_event(start)
+    for name in ('Zed Z', 'Abe A'):
+        car = Car(name, name, 0, 4, event.start_time, event.end_time, '', event.id)
+        db.session.add(car)
+        db.session.flush()
+        for rider in ('Yan Y', 'Bea B'):
+            db.session.add(Rider(f'{rider}-{name}', f'{rider} in {name}', car.id, event.id))
+    db.session.commit()
+    return event.id
+
+
+def positions(html, names):
+    return [html.index(name.encode()) for name in names]
+
+
+def assert_in_order(html, names):
+    found = positions(html, names)
+    assert found == sorted(found)
+
+
+def test_cards_list_cars_and_riders_in_the_order_added(app, client):
+    with app.app_context():
+        add_user('user')
+        seed_out_of_order(local_now() + datetime.timedelta(days=1))
+    login(client, 'user')
+    html = client.get('/home').data
+    assert_in_order(html, ['Need a Ride', 'Zed Z', 'Abe A'])
+    assert_in_order(html, ['Yan Y in Zed Z', 'Bea B in Zed Z', 'Yan Y in Abe A', 'Bea B in Abe A'])
+
+
+def test_archived_cards_list_cars_and_riders_in_the_order_added(app, client):
+    with app.app_context():
+        add_user('user')
+        event_id = seed_out_of_order(local_now() - datetime.timedelta(days=2))
+        Event.query.filter(Event.id == event_id).update({Event.expired: True})
+        db.session.commit()
+        assert ArchivedEvent.archive(10) == 1
+    login(client, 'user')
+    html = client.get('/history').data
+    assert_in_order(html, ['Zed Z', 'Abe A'])
+    assert_in_order(html, ['Yan Y in Zed Z', 'Bea B in Zed Z', 'Yan Y in Abe A', 'Bea B in Abe A'])
@@ -0,0 +1,72 @@
+import datetime
+import time
+
+import pytest
+
+from conftest import add_event, add_user, login
+from rides import db, local_now, routes
+from rides.models import Car, Rider, User
+
+
+@pytest.fixture
+def board(app, client):
+    with app.app_context():
+        add_user('user')
+        event = add_event(local_now() + datetime.timedelta(days=1), cars=1)
+        db.session.commit()
+        car_id = Car.query.filter(Car.event_id == event.id, Car.max_capacity == 4).one().id
+    login(client, 'user')
+    return car_id
+
+
+@pytest.mark.usefixtures('board')
+@pytest.mark.parametrize('path', ['/home', '/api/v1/events'])
+def test_unchanged_board_is_not_modified(client, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    again = client.get(path, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert not again.data
+
+
+@pytest.mark.parametrize('path', ['/home', '/api/v1/events'])
+def test_board_change_changes_etag(app, client, board, path):
+    etag = client.get(path).headers['ETag']
+    with app.app_context():
+        assert Rider.join(Car.query.get(board), 'rider', 'Rider')
+    changed = client.get(path, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert b'Rider' in changed.data
+
+
+def test_login_refreshes_cached_user(app, client, monkeypatch):
+    with app.app_context():
+        add_user('user')
+        db.session.commit()
+        assert routes.load_user('user').firstname == 'User'
+    # Skip the OIDC round trip and hand the callback its userinfo directly.
+    monkeypatch.setitem(app.view_functions, 'rides.csh_auth', routes.csh_auth.__wrapped__)
+    with client.session_transaction() as session:
+        session['userinfo'] = {'preferred_username': 'user', 'given_name': 'New', 'family_name': 'Name'}
+    assert client.get('/csh-auth').status_code == 302
+    with app.app_context():
+        user = routes.load_user('user')
+    assert (user.firstname, user.lastname) == ('New', 'Name')
+
+
+def test_cached_user_expires(app, monkeypatch):
+    user_cache = app.extensions['user_cache']
+    with app.app_context():
+        add_user('user')
+        db.session.commit()
+        assert routes.load_user('user').firstname == 'User'
+        # Renamed behind this worker's back, as another worker's login would.
+        User.query.get('user').firstname = 'New'
+        db.session.commit()
+        assert routes.load_user('user').firstname == 'User'
+        later = time.monotonic() + user_cache.ttl + 1
+        monkeypatch.setattr(time, 'monotonic', lambda: later)
+        assert routes.load_user('user').firstname == 'New'
@@ -0,0 +1,79 @@
+import datetime
+import shutil
+import time
+
+import pytest
+from flask import g
+
+from conftest import add_event, add_user, login
+from rides import db, local_now
+from rides.models import Car, Event, Rider, User
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {'SQLALCHEMY_REPLICA_URI': f"sqlite:///{tmp_path / 'replica.db'}", 'REPLICA_STICKY_SECONDS': 1}
+
+
+@pytest.fixture
+def car_id(app, client, tmp_path):
+    """
+    A car on the board, copied to the replica, after which the event is renamed
+    on the primary only, as if the replica had fallen behind.
+    """
+    with app.app_context():
+        add_user('user')
+        event = add_event(local_now() + datetime.timedelta(days=1), cars=1)
+        db.session.commit()
+        car = Car.query.filter(Car.event_id == event.id, Car.max_capacity == 4).one().id
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+        shutil.copy(tmp_path / 'rides.db', tmp_path / 'replica.db')
+        event.name = 'Renamed'
+        db.session.add(event)
+        db.session.commit()
+    login(client, 'user')
+    return car
+
+
+def board(client):
+    response = client.get('/api/v1/events')
+    assert response.status_code == 200
+    event, = response.json['events']
+    car = next(car for car in event['cars'] if car['max_capacity'] == 4)
+    return event['name'], [rider['username'] for rider in car['riders']]
+
+
+def usernames(app, column, bind_key):
+    """`column` from every row, read straight from the primary (None) or the replica."""
+    with app.app_context():
+        return db.session.execute(db.select(column), bind_arguments={'bind': db.engines[bind_key]}).scalars().all()
+
+
+@pytest.mark.usefixtures('car_id')
+def test_views_read_from_the_replica(client):
+    assert board(client) == ('Event', [])
+
+
+def test_reads_stick_to_the_primary_after_a_write(app, client, car_id):
+    assert client.post(f'/join/{car_id}/user').status_code == 302
+    assert usernames(app, Rider.username, None) == ['user']
+    assert usernames(app, Rider.username, 'replica') == []
+    # The user sees their own change while the replica catches up.
+    assert board(client) == ('Renamed', ['user'])
+    time.sleep(app.config['REPLICA_STICKY_SECONDS'])
+    assert board(client) == ('Event', [])
+
+
+@pytest.mark.usefixtures('car_id')
+def test_flush_sends_later_reads_to_the_primary(app):
+    with app.test_request_context():
+        g.read_replica = True
+        assert db.session.get_bind(clause=db.select(Event)) is db.engines['replica']
+        add_user('new')
+        db.session.flush()
+        assert db.session.get_bind(clause=db.select(Event)) is db.engine
+        db.session.commit()
+    assert 'new' in usernames(app, User.id, None)
+    assert 'new' not in usernames(app, User.id, 'replica')
@@ -0,0 +1,81 @@
+import datetime
+
+from sqlalchemy import event as sa_event
+
+from conftest import add_event, add_user, login
+from rides import db, local_now
+from rides.models import BoardState, Car, Event, Rider
+
+
+def orphans():
+    """Cars and riders whose event or car is gone; the cascades should leave none."""
+    def missing(child, parent, column):
+        return child.query.outerjoin(parent, column == parent.id).filter(parent.id.is_(None)).count()
+    return (missing(Car, Event, Car.event_id)
+            + missing(Rider, Car, Rider.car_id)
+            + missing(Rider, Event, Rider.event_id))
+
+
+def count_statements(app, client, path):
+    count = [0]
+
+    def on_execute(*_args):
+        count[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    sa_event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        response = client.post(path)
+    finally:
+        sa_event.remove(engine, 'before_cursor_execute', on_execute)
+    assert response.status_code == 302
+    return count[0]
+
+
+def seed(app, riders):
+    """Two events, each with two roomy cars of `riders` riders. Returns their ids."""
+    with app.app_context():
+        add_user('creator')
+        ids = []
+        for n in riders:
+            event = add_event(local_now() + datetime.timedelta(days=1, hours=n), cars=2, seats=8, riders=n)
+            add_user(f'driver{event.id}-0')
+            ids.append(event.id)
+        # Create the board_state row now, so the first delete does not pay for it.
+        BoardState.bump()
+        db.session.commit()
+    return ids
+
+
+def test_delete_ride_leaves_no_orphans(app, client):
+    few, many = seed(app, [1, 4])
+    login(client, 'creator')
+    client.get('/home')
+    counts = [count_statements(app, client, f'/delete/ride/{event_id}') for event_id in (few, many)]
+    assert counts[0] == counts[1]
+    with app.app_context():
+        assert Event.query.count() == 0
+        assert Car.query.count() == 0
+        assert Rider.query.count() == 0
+        assert orphans() == 0
+
+
+def test_delete_car_leaves_no_orphans(app, client):
+    few, many = seed(app, [1, 4])
+    counts = []
+    for event_id, riders in ((few, 1), (many, 4)):
+        driver = f'driver{event_id}-0'
+        with app.app_context():
+            car_id = Car.query.filter(Car.username == driver).one().id
+        login(client, driver)
+        client.get('/home')
+        counts.append(count_statements(app, client, f'/delete/car/{car_id}'))
+        with app.app_context():
+            assert Car.query.get(car_id) is None
+            # The riders are moved into the event's other car, not deleted.
+            other = Car.query.filter(Car.event_id == event_id, Car.max_capacity == 8).one()
+            assert other.current_capacity == 2 * riders
+            assert Rider.query.filter(Rider.event_id == event_id).count() == 2 * riders
+            assert orphans() == 0
+    assert counts[0] == counts[1]
@@ -0,0 +1,21 @@
+import datetime
+
+from conftest import add_event, add_user, login
+from rides import db, local_now
+from rides.models import Car
+
+
+def test_card_missing_a_car_is_rendered_again(app, client):
+    with app.app_context():
+        add_user('user')
+        event = add_event(local_now() + datetime.timedelta(days=1))
+        db.session.commit()
+        # Cached from a snapshot of the event without the car added below, under the same version.
+        app.extensions['card_cache'].set(f'card:{event.id}:{event.version}', {'details': '', 'cars': {}})
+        car = Car('driver', 'Stale Test Car', 0, 4, event.start_time, event.end_time, '', event.id)
+        db.session.add(car)
+        db.session.commit()
+    login(client, 'user')
+    response = client.get('/home')
+    assert response.status_code == 200
+    assert b'Stale Test Car' in response.data
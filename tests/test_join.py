@@ -0,0 +1,93 @@
+import datetime
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from conftest import add_event
+from rides import db, local_now
+from rides.models import Car, Rider
+
+
+def new_car(event, username, seats=4):
+    return Car(username, 'Driver', 0, seats, event.start_time, event.end_time, '', event.id)
+
+
+def test_driver_cannot_join(app):
+    with app.app_context():
+        event = add_event(local_now() + datetime.timedelta(days=1))
+        assert Car.offer(new_car(event, 'driver'))
+        db.session.commit()
+        other = new_car(event, 'other')
+        assert Car.offer(other)
+        db.session.commit()
+        assert not Rider.join(other, 'driver', 'Driver')
+        assert other.current_capacity == 0
+
+
+def test_rider_cannot_drive(app):
+    with app.app_context():
+        event = add_event(local_now() + datetime.timedelta(days=1))
+        car = new_car(event, 'driver')
+        assert Car.offer(car)
+        db.session.commit()
+        assert Rider.join(car, 'rider', 'Rider')
+        assert not Car.offer(new_car(event, 'rider'))
+        db.session.rollback()
+        assert Car.query.filter(Car.username == 'rider').count() == 0
+
+
+def stampede(app, joins):
+    """Run each (car_id, username) join in its own thread, all at once. Returns how many succeeded."""
+    results = []
+    start = threading.Barrier(len(joins))
+
+    def join(car_id, username):
+        with app.app_context():
+            car = Car.query.get(car_id)
+            start.wait()
+            results.append(Rider.join(car, username, username))
+            db.session.remove()
+
+    threads = [threading.Thread(target=join, args=args) for args in joins]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(results)
+
+
+def test_concurrent_joins_do_not_overbook(app):
+    with app.app_context():
+        event = add_event(local_now() + datetime.timedelta(days=1), cars=1, seats=2)
+        db.session.commit()
+        car_id = Car.query.filter(Car.event_id == event.id, Car.max_capacity == 2).one().id
+    assert stampede(app, [(car_id, f'user{n}') for n in range(8)]) == 2
+    with app.app_context():
+        car = Car.query.get(car_id)
+        assert car.current_capacity == 2
+        assert Rider.query.filter(Rider.car_id == car_id).count() == 2
+
+
+def test_concurrent_joins_do_not_double_join(app):
+    with app.app_context():
+        event = add_event(local_now() + datetime.timedelta(days=1), cars=2, seats=4)
+        db.session.commit()
+        event_id = event.id
+        car_ids = [car.id for car in Car.query.filter(Car.event_id == event_id, Car.max_capacity == 4)]
+    # The same user goes for both cars at once, several times over.
+    assert stampede(app, [(car_id, 'user') for car_id in car_ids] * 3) == 1
+    with app.app_context():
+        assert Rider.query.filter(Rider.event_id == event_id, Rider.username == 'user').count() == 1
+        assert sum(car.current_capacity for car in Car.query.filter(Car.id.in_(car_ids))) == 1
+
+
+def test_duplicate_rider_is_rejected(app):
+    with app.app_context():
+        event = add_event(local_now() + datetime.timedelta(days=1), cars=2)
+        first, second = Car.query.filter(Car.event_id == event.id, Car.max_capacity == 4)
+        db.session.add(Rider('user', 'User', first.id, event.id))
+        db.session.commit()
+        db.session.add(Rider('user', 'User', second.id, event.id))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
@@ -0,0 +1,48 @@
+import datetime
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import add_event, add_user, login
+from rides import db, local_now
+from rides.models import Car
+
+
+@pytest.mark.parametrize('backend', ['memory', 'database'])
+def test_stream_relays_a_join(app, backend):
+    app.config.update(LIVE_BACKEND=backend, LIVE_STREAM_SECONDS=2, LIVE_HEARTBEAT=0.2, LIVE_POLL_INTERVAL=0.1)
+    with app.app_context():
+        add_user('watcher')
+        add_user('rider')
+        event = add_event(local_now() + datetime.timedelta(days=1), cars=1)
+        db.session.commit()
+        car_id = Car.query.filter(Car.event_id == event.id, Car.max_capacity == 4).one().id
+
+    def join():
+        # Give the stream time to subscribe first.
+        time.sleep(0.5)
+        joiner = app.test_client()
+        login(joiner, 'rider')
+        joiner.post(f'/join/{car_id}/rider')
+
+    watcher = app.test_client()
+    login(watcher, 'watcher')
+    response = watcher.get('/stream', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    thread = threading.Thread(target=join)
+    thread.start()
+    # The stream ends by itself after LIVE_STREAM_SECONDS.
+    body = b''.join(response.response).decode()
+    thread.join()
+    response.close()
+
+    events = [dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+              for block in body.split('\n\n') if block.strip()]
+    cars = [json.loads(event['data']) for event in events if event.get('event') == 'car']
+    assert len(cars) == 1
+    assert cars[0]['car_id'] == car_id
+    assert cars[0]['current_capacity'] == 1
+    assert cars[0]['riders'] == ['User rider']
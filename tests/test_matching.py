@@ -0,0 +1,65 @@
+import datetime
+
+from conftest import add_event, add_user, login
+from rides import db, local_now, matching, routes
+from rides.matching import POOL_USERNAME
+from rides.models import Car, Rider
+
+
+def seed(app, seats, riders):
+    """An event with a car of `seats` seats and `riders` riders, and 'waiting' in Need a Ride."""
+    with app.app_context():
+        for username in ('rider', 'waiting'):
+            add_user(username)
+        event = add_event(local_now() + datetime.timedelta(days=1))
+        pool = Car.query.filter(Car.event_id == event.id, Car.username == POOL_USERNAME).one()
+        car = Car('driver', 'Driver', 0, seats, event.start_time, event.end_time, '', event.id)
+        db.session.add(car)
+        db.session.commit()
+        for n in range(riders):
+            assert Rider.join(car, 'rider' if n == 0 else f'other{n}', 'Rider')
+        return event.id, pool.id, car.id
+
+
+def seat_of(app, username, event_id):
+    with app.app_context():
+        return Rider.query.filter(Rider.event_id == event_id, Rider.username == username).one().car_id
+
+
+def test_leaving_seats_a_waiting_rider(app, client):
+    event_id, pool_id, car_id = seed(app, seats=2, riders=2)
+    with app.app_context():
+        assert Rider.join(Car.query.get(pool_id), 'waiting', 'Waiting')
+    login(client, 'rider')
+    assert client.post(f'/delete/rider/{car_id}/rider').status_code == 302
+    assert seat_of(app, 'waiting', event_id) == car_id
+    with app.app_context():
+        assert Car.query.get(car_id).current_capacity == 2
+        assert Car.query.get(pool_id).current_capacity == 0
+
+
+def test_joining_the_pool_with_seats_free_seats_the_rider(app, client):
+    event_id, pool_id, car_id = seed(app, seats=2, riders=1)
+    login(client, 'waiting')
+    assert client.post(f'/join/{pool_id}/waiting').status_code == 302
+    assert seat_of(app, 'waiting', event_id) == car_id
+
+
+def test_pings_name_riders_alike(app, client, monkeypatch):
+    pings = []
+    monkeypatch.setattr(routes, 'send_join', lambda *args: pings.append(args))
+    monkeypatch.setattr(matching, 'send_join', lambda *args: pings.append(args))
+    seed(app, seats=3, riders=1)
+    with app.app_context():
+        add_user('1234')
+        db.session.commit()
+    for username in ('waiting', '1234'):
+        login(client, username)
+        with app.app_context():
+            pool_id = Car.query.filter(Car.username == POOL_USERNAME).one().id
+        assert client.post(f'/join/{pool_id}/{username}').status_code == 302
+    # Each rider pings Need a Ride on joining it, then the driver on being seated.
+    assert pings == [(POOL_USERNAME, 'User waiting (@waiting)', 'Event'),
+                     ('driver', 'User waiting (@waiting)', 'Event'),
+                     (POOL_USERNAME, 'User 1234', 'Event'),
+                     ('driver', 'User 1234', 'Event')]
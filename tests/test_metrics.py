@@ -0,0 +1,28 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from rides import db
+
+
+def test_metrics_not_served_without_token(app, client):
+    app.config['METRICS_TOKEN'] = ''
+    assert client.get('/metrics').status_code == 404
+
+
+def test_metrics_require_token(app, client):
+    app.config['METRICS_TOKEN'] = 'secret'
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert b'rideboard_request_seconds' in response.data
+
+
+def test_failed_statement_is_not_left_timing(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM no_such_table'))
+            conn.execute(text('SELECT 1'))
+            assert not conn.info['query_started']
@@ -0,0 +1,87 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from rides import pings
+
+
+class FakePings:
+    """A Pings server answering each ping with the next of `statuses`, then 200."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.received = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):  # pylint: disable=invalid-name
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                fake.received.append((self.path, self.headers['Authorization'], body))
+                self.send_response(fake.statuses.pop(0) if fake.statuses else 200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *_args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_pings(app):
+    fakes = []
+
+    def start(*statuses):
+        fake = FakePings(statuses)
+        fakes.append(fake)
+        app.config.update(PINGS_ENABLED=True, PINGS_URL=fake.url, PINGS_TOKEN='token',
+                          PINGS_JOIN_ROUTE_UUID='join-route', PINGS_MAX_ATTEMPTS=3, PINGS_BACKOFF=0)
+        return fake
+
+    pings.dead_letters.clear()
+    yield start
+    for fake in fakes:
+        fake.close()
+
+
+def send(app):
+    with app.app_context():
+        pings.send_join('driver', 'Rider (@rider)', 'Event')
+    assert pings.flush(timeout=10)
+
+
+def test_delivers(app, fake_pings):
+    fake = fake_pings()
+    send(app)
+    assert fake.received == [('/service/route/join-route/ping', 'Bearer token',
+                              {'username': 'driver', 'body': '@Rider (@rider) has joined "Event"'})]
+    assert not pings.dead_letters
+
+
+def test_retries_server_errors(app, fake_pings):
+    fake = fake_pings(503, 500)
+    send(app)
+    assert len(fake.received) == 3
+    assert not pings.dead_letters
+
+
+def test_dead_letters_after_max_attempts(app, fake_pings):
+    fake = fake_pings(503, 503, 503, 503)
+    send(app)
+    assert len(fake.received) == 3
+    assert [(ping.username, reason) for ping, reason in pings.dead_letters] == [('driver', 'HTTP 503')]
+
+
+def test_dead_letters_client_errors_without_retrying(app, fake_pings):
+    fake = fake_pings(401)
+    send(app)
+    assert len(fake.received) == 1
+    assert [reason for _, reason in pings.dead_letters] == ['HTTP 401']
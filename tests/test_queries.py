@@ -0,0 +1,54 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+from conftest import add_event, add_user, login
+from rides import db, local_now
+
+# The board and history load events, cars and riders with a fixed number of
+# SELECTs (see Event.with_cars_and_riders), so the statements per request must
+# not grow with the number of events shown.
+MAX_QUERIES = 10
+
+
+def count_queries(app, client, path):
+    count = [0]
+
+    def on_execute(*_args):
+        count[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+    assert response.status_code == 200
+    return count[0]
+
+
+def seed(app, events):
+    now = local_now()
+    with app.app_context():
+        for n in range(events):
+            add_event(now + datetime.timedelta(days=1, hours=n), cars=3, riders=2)
+            add_event(now - datetime.timedelta(days=2, hours=n), cars=3, riders=2)
+        db.session.commit()
+
+
+@pytest.mark.parametrize('path', ['/home', '/history'])
+def test_queries_do_not_grow_with_events(app, client, path):
+    with app.app_context():
+        add_user('user')
+        db.session.commit()
+    login(client, 'user')
+    seed(app, 2)
+    # Warm the user cache so both counts are taken alike.
+    client.get(path)
+    few = count_queries(app, client, path)
+    seed(app, 15)
+    many = count_queries(app, client, path)
+    assert few == many
+    assert many <= MAX_QUERIES
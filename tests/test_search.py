@@ -0,0 +1,51 @@
+import datetime
+
+from conftest import add_user, login
+from rides import db, local_now, search
+from rides.models import Event
+
+
+def event_form(name, address):
+    start = local_now() + datetime.timedelta(days=1)
+    return {
+        'name': name,
+        'address': address,
+        'start_date_time': start.strftime('%Y-%m-%d %H:%M'),
+        'end_date_time': (start + datetime.timedelta(hours=3)).strftime('%Y-%m-%d %H:%M')
+    }
+
+
+def found(client, query, event_id):
+    response = client.get('/search', query_string={'q': query})
+    assert response.status_code == 200
+    return f'/home#event{event_id}' in response.text
+
+
+def indexed(app, query):
+    with app.app_context():
+        return search.search(query, 10)
+
+
+def test_search_follows_the_event_forms(app, client):
+    with app.app_context():
+        add_user('creator')
+        db.session.commit()
+    login(client, 'creator')
+
+    assert client.post('/eventform', data=event_form('Bowling Night', 'Lakeside Lanes')).status_code == 302
+    with app.app_context():
+        event_id = Event.query.one().id
+    assert found(client, 'bowl', event_id)
+    assert found(client, 'lakeside', event_id)
+
+    assert client.post(f'/edit/eventform/{event_id}',
+                       data=event_form('Karaoke Night', 'Main Street')).status_code == 302
+    assert found(client, 'karaoke', event_id)
+    assert found(client, 'main street', event_id)
+    assert not found(client, 'bowling', event_id)
+    assert not found(client, 'lakeside', event_id)
+
+    assert client.post(f'/delete/ride/{event_id}').status_code == 302
+    assert not found(client, 'karaoke', event_id)
+    # The page skips ids it cannot load, so check the index itself was cleaned up too.
+    assert indexed(app, 'karaoke') == []
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from conftest import add_user, login
+from rides import db
+
+
+@pytest.fixture(params=['database', 'filesystem'])
+def app_config(request, tmp_path):
+    return {'SESSION_BACKEND': request.param, 'SESSION_DIR': str(tmp_path / 'sessions')}
+
+
+@pytest.fixture
+def user(app):
+    with app.app_context():
+        add_user('user')
+        db.session.commit()
+    return 'user'
+
+
+def session_id(app, client):
+    return next(cookie.value for cookie in client.cookie_jar if cookie.name == app.config['SESSION_COOKIE_NAME'])
+
+
+def stored(app, sid):
+    with app.app_context():
+        return app.session_interface.store.load(sid)
+
+
+def test_cookie_holds_only_an_id(app, client, user):
+    login(client, user)
+    with client.session_transaction() as session:
+        # About the size of what flask-pyoidc keeps after an SSO login.
+        session['userinfo'] = {'claims': 'x' * 4000}
+    sid = session_id(app, client)
+    assert len(sid) < 64
+    assert stored(app, sid) is not None
+    assert client.get('/home').status_code == 200
+    with client.session_transaction() as session:
+        assert session['_user_id'] == user
+        assert len(session['userinfo']['claims']) == 4000
+
+
+def test_login_gets_a_new_session_id(app, client, user):
+    with client.session_transaction() as session:
+        session['next'] = '/home'
+    before = session_id(app, client)
+    login(client, user)
+    after = session_id(app, client)
+    assert after != before
+    assert stored(app, before) is None
+    assert stored(app, after) is not None
+    assert client.get('/home').status_code == 200
+
+
+def test_prune_drops_expired_sessions(app, user):
+    expired, current = app.test_client(), app.test_client()
+    for client in (expired, current):
+        login(client, user)
+    sid = session_id(app, expired)
+    data, _ = stored(app, sid)
+    with app.app_context():
+        app.session_interface.store.save(sid, data, time.time() - 1)
+
+    result = app.test_cli_runner().invoke(args=['prune-sessions'])
+    assert result.exit_code == 0
+    assert 'Pruned 1 session(s)' in result.output
+    assert stored(app, session_id(app, current)) is not None
+    assert current.get('/home').status_code == 200
+    assert expired.get('/home').status_code != 200